@@ -0,0 +1,294 @@
+"""Benchmarks of the setup, I/O and parsing hot paths.
+
+Run from the repository root:
+
+    python3 -m benchmarks.run [--sizes 100 1000] [--only parser write]
+
+Every benchmark is timed for each system size, the number of rigid
+bodies and solvent particles, or of rigid bodies in generated files.
+The results are printed next to their ratio to the committed baseline
+and appended as one JSON line to the local history file, tagged with the
+current git commit. --save-baseline replaces the baseline with the run.
+hoomd is replaced by a
+stand-in when it is not installed, numpy, PyYAML and gsd are required."""
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import datetime
+import platform
+import tempfile
+import subprocess
+import numpy as np
+from typing import Callable
+from . import stand_in
+
+STAND_IN = stand_in.install()
+
+import yaml
+import gsd.hoomd
+from src import parsecache
+from src import snapshot
+from src import snapshotcache
+from src import utils
+from src.box import Box
+from src.parser import Parser
+from src.particle import Particle
+from src.rigidbody import RigidBody
+from src.simulation import Simulation
+from src.yaml_keys import SimType
+
+
+SIZES = [100, 1000, 10000, 100000]
+PACKING_FRACTIONS = [0.05, 0.1, 0.2, 0.3]
+HISTORY_FILE = os.path.join(os.path.dirname(__file__), "history.jsonl")
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), "baseline.json")
+TIMESTAMP = "20000101_000000"
+
+
+def timeit(fn: Callable, repeat: int=1) -> float:
+    """Best wall time of `repeat` calls."""
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def box_for(n: int, dmin: float, phi: float) -> Box:
+    """Cubic box where n exclusion spheres of diameter dmin fill phi."""
+    L = (n * math.pi / 6. * dmin**3 / phi)**(1/3.)
+    return Box(L, L, L)
+
+
+def make_yaml(path: str, n_types: int, n_bodies: int) -> None:
+    """Write a run file with n_types particle and rigid body types and
+    all pair interactions between them."""
+    labels = [f"P{i}" for i in range(n_types)]
+    rbs = []
+    for i, label in enumerate(labels):
+        aux = labels[(i+1) % n_types]
+        rbs.append({f"R{i}": [
+            {label: {"position": [0, 0, 0], "is_center": True}},
+            {aux: {"position": [-1, 0, 0]}},
+            {aux: {"position": [1, 0, 0]}}]})
+    interactions = [{a: {"with": labels[i:], "epsilon": 1, "sigma": 1,
+                         "alpha": 0}} for i, a in enumerate(labels)]
+    box = box_for(n_bodies, 5., 0.1)
+    data = {
+        "project_name": "bench",
+        "particles": [{label: {"q": 0, "m": 1, "diam": 1}}
+                      for label in labels],
+        "rigidbodies": rbs,
+        "box": box.as_dict(),
+        "interactions": interactions,
+        "simulation": {
+            "rigidbodies": [{f"R{i}": max(n_bodies // n_types, 1)}
+                            for i in range(n_types)],
+            "kT": 1., "dt": 0.005, "seed": 1, "period": 1e3,
+            "duration": 1e6}}
+    with open(path, "w") as f:
+        yaml.dump(data, f)
+
+
+def make_simulation(n: int, path: str, phi: float=0.1) -> Simulation:
+    """Two rigid body types and a solvent, n particles in total."""
+    a, b = Particle("A", q=1), Particle("B")
+    aux, sol = Particle("C", q=-1), Particle("S")
+    sim = Simulation(project="bench", kT=1., dt=0.005, period=1,
+                     duration=1, seed=1, box=box_for(n, 5., phi), path=path)
+    for label, center in (("V", a), ("H", b)):
+        rb = RigidBody(label)
+        rb.add_particle(center, [0, 0, 0], is_center=True)
+        rb.add_particle(aux, [-1, 0, 0])
+        rb.add_particle(aux, [1, 0, 0])
+        sim.add_rigidbody(rb, n // 4)
+    sim.add_solvent(sol, n - 2 * (n // 4))
+    return sim
+
+
+def write_trajectory(sim: Simulation, frames: int=3) -> None:
+    """Synthetic trajectory with the kept particles and two constituents
+    per rigid body."""
+    Frame = getattr(gsd.hoomd, "Frame", None) or gsd.hoomd.Snapshot
+    n_centers = sim.count_center_particles()
+    typeid = np.concatenate([
+        np.repeat([sim.type_id(rb.get_center().label)
+                   for rb, *_ in sim.iter_rigidbodies()],
+                  [count for *_, count in sim.iter_rigidbodies()]),
+        np.full(sim.count_solvents(), sim.type_id("S")),
+        np.full(2 * n_centers, sim.type_id("C"))])
+    N = len(typeid)
+    try:
+        trajectory = gsd.hoomd.open(sim.trajectory_file, mode="wb")
+    except ValueError:
+        trajectory = gsd.hoomd.open(sim.trajectory_file, mode="w")
+    with trajectory:
+        for step in range(frames):
+            frame = Frame()
+            frame.configuration.step = step
+            frame.configuration.box = [sim.box.Lx, sim.box.Ly, sim.box.Lz,
+                                       0, 0, 0]
+            frame.particles.N = N
+            frame.particles.types = sim.types_list
+            frame.particles.typeid = typeid
+            frame.particles.position = np.random.uniform(
+                -sim.box.Lx/2., sim.box.Lx/2., (N, 3)).astype(np.float32)
+            frame.particles.orientation = utils.random_quaternions(N) \
+                                          .astype(np.float32)
+            trajectory.append(frame)
+
+
+def bench_parser(n: int, tmp: str) -> list:
+    n_types = max(2, int(math.sqrt(n)))
+    fname = f"parser_{n}.yaml"
+    make_yaml(os.path.join(tmp, fname), n_types, n)
+    parsecache.PARSE_CACHE_DIR = os.path.join(tmp, f"cache_{n}")
+    cold = timeit(lambda: Parser(fname, abs_path=tmp))
+    cached = timeit(lambda: Parser(fname, abs_path=tmp), repeat=3)
+    return [{"name": "parser", "size": n, "types": n_types,
+             "seconds": cold},
+            {"name": "parser_cached", "size": n, "types": n_types,
+             "seconds": cached}]
+
+
+def bench_write(n: int, tmp: str) -> list:
+    n_types = max(2, int(math.sqrt(n)))
+    fname = f"write_{n}.yaml"
+    make_yaml(os.path.join(tmp, fname), n_types, n)
+    parsecache.PARSE_CACHE_DIR = os.path.join(tmp, f"cache_{n}")
+    sim = Parser(fname, abs_path=tmp).simulation
+    out = os.path.join(tmp, f"written_{n}.yaml")
+    seconds = timeit(lambda: Parser.write(sim, out), repeat=3)
+    return [{"name": "parser_write", "size": n, "types": n_types,
+             "seconds": seconds}]
+
+
+def bench_fresh_snapshot(n: int, tmp: str) -> list:
+    sim = make_simulation(n, tmp)
+    sim.simtype = SimType.RUN
+
+    # The first call places the particles, later ones hit the cache
+    snapshotcache.SNAPSHOT_CACHE_DIR = os.path.join(tmp, f"snapshots_{n}")
+    cold = timeit(lambda: snapshot.fresh_snapshot(sim))
+    cached = timeit(lambda: snapshot.fresh_snapshot(sim), repeat=3)
+    return [{"name": "fresh_snapshot", "size": n, "seconds": cold},
+            {"name": "fresh_snapshot_cached", "size": n,
+             "seconds": cached}]
+
+
+def bench_place_particle(n: int, tmp: str) -> list:
+    results = []
+    for phi in PACKING_FRACTIONS:
+        snap = stand_in.Snapshot(n, box_for(n, 1., phi), ["A"])
+
+        def run():
+            np.random.seed(1)
+            grid = utils.SpatialHash(snap.box, cell_size=1.)
+            for i in range(n):
+                utils.place_particle(snap, i, dmin=1., grid=grid)
+
+        try:
+            seconds = timeit(run)
+        except Exception as e:
+            seconds = None
+            print(f"place_particle n={n} phi={phi}: {e}")
+        results.append({"name": "place_particle", "size": n,
+                        "packing_fraction": phi, "seconds": seconds})
+    return results
+
+
+def bench_continue_snapshot(n: int, tmp: str) -> list:
+    sim = make_simulation(n, tmp)
+    sim.simtype = SimType.CONTINUE
+    sim.timestamp = TIMESTAMP
+    sim.project = f"continue{n}"
+    sim.start_from = 1
+    write_trajectory(sim)
+    seconds = timeit(lambda: snapshot.continue_snapshot(sim), repeat=3)
+    return [{"name": "continue_snapshot", "size": n, "seconds": seconds}]
+
+
+BENCHMARKS = {
+    "parser": bench_parser,
+    "write": bench_write,
+    "fresh_snapshot": bench_fresh_snapshot,
+    "place_particle": bench_place_particle,
+    "continue_snapshot": bench_continue_snapshot,
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL
+        ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def result_key(result: dict) -> str:
+    """Identifies a result by everything but its time."""
+    return json.dumps({k: v for k, v in result.items() if k != "seconds"},
+                      sort_keys=True)
+
+
+def load_baseline(file: str) -> dict:
+    """Seconds of the baseline results by their result_key."""
+    if not os.path.exists(file): return {}
+    with open(file) as f:
+        record = json.load(f)
+    return {result_key(r): r["seconds"] for r in record["results"]}
+
+
+def main(args: list) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--only", nargs="+", choices=list(BENCHMARKS),
+                        default=list(BENCHMARKS))
+    parser.add_argument("--history", default=HISTORY_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    opts = parser.parse_args(args)
+    baseline = load_baseline(opts.baseline)
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in opts.only:
+            for n in opts.sizes:
+                for result in BENCHMARKS[name](n, tmp):
+                    seconds = result["seconds"]
+                    shown = "failed" if seconds is None else f"{seconds:.4f} s"
+                    before = baseline.get(result_key(result))
+                    ratio = f"x{seconds / before:.2f}" \
+                            if seconds and before else ""
+                    extra = {k: v for k, v in result.items()
+                             if k not in ("name", "size", "seconds")}
+                    print(f"{result['name']:<22} {n:>8} {shown:>12} "
+                          f"{ratio:>7} {extra or ''}")
+                    results.append(result)
+
+    record = {
+        "commit": git_commit(),
+        "date": datetime.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "hoomd_stand_in": STAND_IN,
+        "results": results,
+    }
+    with open(opts.history, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    if opts.save_baseline:
+        with open(opts.baseline, "w") as f:
+            json.dump(record, f, indent=1)
+            f.write("\n")
+
+
+
+if __name__ == "__main__":
+
+    main(sys.argv[1:])
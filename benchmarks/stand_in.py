@@ -0,0 +1,60 @@
+"""Stand-in for the parts of hoomd used to build snapshots.
+
+It is only installed when hoomd can not be imported, so the benchmarks
+also run on a plain CPU box without the simulation engine."""
+import sys
+import types
+import numpy as np
+
+
+class BoxDim:
+
+    def __init__(self, Lx: float, Ly: float, Lz: float):
+        self.Lx = Lx
+        self.Ly = Ly
+        self.Lz = Lz
+
+
+
+class ParticleData:
+
+    def __init__(self, N: int, types: list):
+        self.N = N
+        self.types = types
+        self.typeid = np.zeros(N, dtype=np.uint32)
+        self.position = np.zeros((N, 3), dtype=np.float32)
+        self.orientation = np.zeros((N, 4), dtype=np.float32)
+        self.charge = np.zeros(N, dtype=np.float32)
+        self.diameter = np.ones(N, dtype=np.float32)
+        self.moment_inertia = np.zeros((N, 3), dtype=np.float32)
+        self.velocity = np.zeros((N, 3), dtype=np.float32)
+        self.angmom = np.zeros((N, 4), dtype=np.float32)
+        self.image = np.zeros((N, 3), dtype=np.int32)
+
+
+
+class Snapshot:
+
+    def __init__(self, N: int, box: BoxDim, particle_types: list):
+        self.box = box
+        self.particles = ParticleData(N, particle_types)
+
+
+
+def make_snapshot(N: int, box: BoxDim,
+                  particle_types: list=["A"]) -> Snapshot:
+    return Snapshot(N, box, list(particle_types))
+
+
+def install() -> bool:
+    """Register the stand-in as `hoomd` if the real one is missing."""
+    try:
+        import hoomd
+        return False
+    except ImportError:
+        pass
+    module = types.ModuleType("hoomd")
+    module.data = types.SimpleNamespace(boxdim=BoxDim,
+                                        make_snapshot=make_snapshot)
+    sys.modules["hoomd"] = module
+    return True
@@ -1,23 +1,194 @@
+import os
 import sys
+import argparse
 from src.parser import Parser
 from src import md
+from src import scheduler
+from src import device
+from src import export
+from src import mpi
+from src import catalog
+from src import plan
+from src.sharedframe import SharedFrame
+from src.instrument import Instrumentation
 from src.simulation import Simulation
+from src.yaml_keys import SimType
+from src.utils import SIMULATIONS_DIR
+
+
+
+def load_simulation(fname: str) -> Simulation:
+    """Simulation of a yaml file written to the simulations directory."""
+    fname = os.path.basename(fname)
+    sim = Parser(fname, abs_path=SIMULATIONS_DIR).simulation
+    sim.project_filename = fname
+    return sim
+
+
+
+def export_main(args: list) -> None:
+    parser = argparse.ArgumentParser(prog="main.py export",
+        description="Export a trajectory to chunked NumPy arrays.")
+    parser.add_argument("file", help="yaml file of the simulation")
+    parser.add_argument("--types", nargs="+", default=None,
+                        help="particle types (default: centers and solvent)")
+    parser.add_argument("--chunk", type=int, default=100,
+                        help="frames per chunk")
+    parser.add_argument("--workers", type=int, default=None)
+    opts = parser.parse_args(args)
+
+    sim = load_simulation(opts.file)
+    manifest = export.export(sim, types=opts.types, chunk=opts.chunk,
+                             workers=opts.workers)
+    print(f"Exported {manifest['frames']} frames of {sim.project} "
+          f"to {export.export_dir(sim)}")
+
+
+
+def catalog_main(args: list) -> None:
+    parser = argparse.ArgumentParser(prog="main.py catalog",
+        description="Query the catalog of runs.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    runs = commands.add_parser("list", help="list runs")
+    runs.add_argument("filters", nargs="*",
+                      help="parameter filters, e.g. kT=0.05 or dt<0.01")
+    lineage = commands.add_parser("lineage", help="forks of a run")
+    lineage.add_argument("file", help="yaml file of the run")
+    commands.add_parser("scan", help="add runs missing from the catalog")
+    opts = parser.parse_args(args)
+
+    with catalog.Catalog() as cat:
+        if opts.command == "scan":
+            print(f"Added {cat.scan()} runs to the catalog.")
+        elif opts.command == "list":
+            filters = [catalog.parse_filter(f) for f in opts.filters]
+            for run in cat.runs(filters):
+                print(f"{run['file']:<40} {run['status'] or '-':<9} "
+                      f"kT={run['kT']:<8g} dt={run['dt']:<8g} "
+                      f"frames={run['frames']} step={run['final_step']}")
+        elif opts.command == "lineage":
+            for depth, file in cat.lineage(os.path.basename(opts.file)):
+                run = cat.get(file)
+                desc = "not in catalog" if run is None else \
+                       f"kT={run['kT']:g} dt={run['dt']:g}"
+                if run is not None and run["forked_step"] is not None:
+                    desc += f" from step {run['forked_step']}"
+                print(f"{'  ' * depth}{file} ({desc})")
+
+
+
+def plan_main(args: list) -> None:
+    parser = argparse.ArgumentParser(prog="main.py plan",
+        description="Estimate the size, disk use, memory and wall time "
+                    "of a run before launching it.")
+    parser.add_argument("file", help="yaml file of the run")
+    parser.add_argument("devices", nargs="*", default=[],
+                        help="device specs as for runs, by default the "
+                             "device of each run; wall times are estimated "
+                             "from runs measured on the same kind of device")
+    parser.add_argument("--ranks", type=int, default=1,
+                        help="MPI ranks of the run")
+    for name in plan.LIMITS:
+        parser.add_argument(f"--max-{name}", dest=name, default=None,
+                            help=f"reject runs over this {name}")
+    opts = parser.parse_args(args)
+
+    sims = Parser(opts.file).simulations
+    devices = device.from_specs(opts.devices)
+    limits = {name: getattr(opts, name) for name in plan.LIMITS
+              if getattr(opts, name) is not None}
+    rejected = False
+    for sim in sims:
+        # Sweep members run on whichever of the devices is free first
+        candidates = {}
+        for dev in devices or [sim.device]:
+            key = None if dev is None else plan.device_class(dev, opts.ranks)
+            candidates.setdefault(key, dev)
+        estimates = [plan.plan(sim, dev, opts.ranks)
+                     for dev in candidates.values()]
+        est = estimates[0]
+        parts = est["particles"]
+        print(f"{sim.project}: {parts['total']} particles "
+              f"({parts['centers']} centers, {parts['constituents']} "
+              f"constituents, {parts['solvent']} solvent), "
+              f"{est['steps']} steps, {est['frames']} frames")
+        for name, dump in est["dumps"].items():
+            fields = ", ".join(f"{f} {plan.format_size(b)}"
+                               for f, b in dump["fields"].items())
+            print(f"  {name:<12} {dump['frames']} frames of "
+                  f"{plan.format_size(dump['per_frame'])} ({fields or '-'}), "
+                  f"{plan.format_size(dump['bytes'])}")
+        print(f"  {'log':<12} {plan.format_size(est['log'])}")
+        print(f"  disk {plan.format_size(est['disk'])}, "
+              f"memory {plan.format_size(est['memory'])}")
+        over = []
+        for est in estimates:
+            if est["hours"] is not None:
+                print(f"  wall time {est['hours']:.2f} h at "
+                      f"{est['tps']:.1f} steps/s on {est['device']}")
+            elif est["device"] is not None:
+                print(f"  wall time unknown, no runs measured on "
+                      f"{est['device']}")
+            over += [r for r in plan.exceeded(est, {**(sim.limits or {}),
+                                                    **limits})
+                     if r not in over]
+        for reason in over:
+            print(f"  rejected: {reason}")
+        rejected = rejected or bool(over)
+    if rejected: sys.exit(1)
 
 
 
 def main(args: list) -> None:
 
+    if args and args[0] == "export":
+        export_main(args[1:])
+        return
+    if args and args[0] == "catalog":
+        catalog_main(args[1:])
+        return
+    if args and args[0] == "plan":
+        plan_main(args[1:])
+        return
+
     fname = str(args[0])
-    gpu = int(args[1])
+    instr = Instrumentation()
+    instr.phase("parse")
     parser = Parser(fname)
+    instr.end_phase()
     project_name = parser.simulation.project
-    if parser.simulation.is_run():
-        print(f"Running sim project: {project_name} on GPU {gpu}")
-    elif parser.simulation.is_continue():
-        print(f"Continuing sim project: {project_name} on GPU {gpu}")
-    elif parser.simulation.is_fork():
-        print(f"Forking sim project: {project_name} on GPU {gpu}")
-    md.mdrun(parser.simulation, gpu)
+
+    # Devices from the command line take precedence over the yaml file
+    devices = device.from_specs(args[1:])
+    if not devices and parser.simulation.device is not None:
+        devices = [parser.simulation.device]
+    if not devices:
+        raise Exception("No device was given to run the simulation on.")
+    dev = devices[0]
+
+    if len(parser.simulations) > 1:
+        if mpi.is_parallel():
+            raise Exception("Sweeps can not be run with MPI.")
+        print(f"Sweeping sim project: {project_name} with "
+              f"{len(parser.simulations)} runs on "
+              f"{', '.join(str(d) for d in devices)}")
+        # Forked runs share the base frame, decoded once
+        frame = None
+        if parser.simulation.is_fork():
+            frame = SharedFrame.from_simulation(parser.simulation)
+        try:
+            failed = scheduler.run_sweep(parser.simulations, devices,
+                                         frame.handle if frame else None)
+        finally:
+            if frame is not None: frame.close()
+        if failed: sys.exit(1)
+        return
+    ranks = f" with {mpi.size()} MPI ranks" if mpi.is_parallel() else ""
+    action = {SimType.RUN: "Running", SimType.CONTINUE: "Continuing",
+              SimType.FORK: "Forking"}[parser.simulation.simtype]
+    if mpi.is_root():
+        print(f"{action} sim project: {project_name} on {dev}{ranks}")
+    md.mdrun(parser.simulation, dev, instr)
 
 
 
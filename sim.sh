@@ -1,8 +1,11 @@
 #!/bin/bash
 
-############ Run simulations with HOOMD-blue on GPUs ################
+############ Run simulations with HOOMD-blue on GPUs or CPUs ################
 
-GPU_COUNT=`nvidia-smi --list-gpus | wc -l`
+GPU_COUNT=0
+if command -v nvidia-smi > /dev/null; then
+	GPU_COUNT=`nvidia-smi --list-gpus | wc -l`
+fi
 FREE_GPUS=()
 GPU_USAGES=()
 CONTAINER_NAME="hoomd-sim"
@@ -17,18 +20,44 @@ if [[ $1 == "--help" ]] || [[ $1 == "-h" ]]; then
 	echo Commands:
 	echo  - check   Check GPU usage
 	echo  - run     Run simulation
+	echo  - mpirun  Run one simulation over several MPI ranks
+	echo  - export  Export a trajectory to chunked NumPy arrays
+	echo  - catalog Query the catalog of runs
+	echo  - plan    Estimate the disk use, memory and wall time of a run
+	echo
+	echo "Usage of run: ./sim.sh run <file> [device ...]"
+	echo Devices are given as:
+	echo  - \<gpu\> or gpu:\<gpu\>          GPU with the given index
+	echo  - cpu:\<threads\>[:\<cores\>]     CPU threads, optionally pinned to cores, e.g. cpu:8:0-7
+	echo  - cpu/\<n\>                     all CPU cores split into n disjoint slots
+	echo If no device is given the device of the yaml file is used, otherwise all free GPUs.
+	echo
+	echo "Usage of mpirun: ./sim.sh mpirun <ranks> <file> [device]"
+	echo The system is split into domains over the ranks, the default device is cpu.
+	echo
+	echo "Usage of export: ./sim.sh export <file> [--types <type> ...] [--chunk <frames>] [--workers <n>]"
+	echo The file is the yaml file of a simulation in the simulations directory.
+	echo
+	echo "Usage of catalog: ./sim.sh catalog list [<filter> ...] | lineage <file> | scan"
+	echo Filters compare a parameter with a value, e.g. \"kT\<0.1\" or project=test.
+	echo
+	echo "Usage of plan: ./sim.sh plan <file> [device ...] [--ranks <n>] [--max-disk <size>] [--max-memory <size>] [--max-hours <hours>]"
+	echo Wall times are estimated from the speeds of finished runs on the same kind of device.
+	echo Sweep members are estimated on every given device, by default on the device of the yaml file.
 	echo
 	echo Note: the simulated project names are written to current_files.txt.
 fi
 
 
-if [[ $GPU_COUNT -lt 1 ]]; then
-	echo NVIDIA GPU required to run simulations, but none were detected on the system.
-	exit 5
-fi
+function require_gpus() {
+	if [[ $GPU_COUNT -lt 1 ]]; then
+		echo NVIDIA GPU required, but none were detected on the system.
+		exit 5
+	fi
+}
 
 
-if [ ! -e $CURRENT_FILES ]; then
+if [[ $GPU_COUNT -gt 0 ]] && [ ! -e $CURRENT_FILES ]; then
 	touch $CURRENT_FILES
 	for (( i=1; i<=$GPU_COUNT; i++ ));
 	do
@@ -106,6 +135,7 @@ done
 
 
 if [[ $1 == "check" ]]; then
+	require_gpus
 	shift;
 	check_gpus "$@";
 	exit 0
@@ -115,27 +145,102 @@ fi
 if [[ $1 == "run" ]]; then
 
 	shift 1
-	if [ $# -ne 1 ]; then
+	if [ $# -lt 1 ]; then
 		echo Invalid usage of command, please reference --help.
 		exit 10
 	fi
 
-	if [ "${#FREE_GPUS[@]}" -eq 0 ]; then
-		echo There is no GPU available to carry out computations.
-		exit 1
+	file=$1
+	shift 1
+	devices="$*"
+
+	if [ -z "$devices" ] && ! grep -qE "^\s+device:" $file 2> /dev/null; then
+		require_gpus
+		if [ "${#FREE_GPUS[@]}" -eq 0 ]; then
+			echo There is no GPU available to carry out computations.
+			exit 1
+		fi
+		devices="${FREE_GPUS[*]}"
+	fi
+	echo Will use devices: ${devices:-from $file}
+
+
+	docker exec -i \
+		$CONTAINER_NAME \
+		bash -c "python3 ./main.py $file $devices"
+
+	exit 0
+
+fi
+
+if [[ $1 == "mpirun" ]]; then
+
+	shift 1
+	if [ $# -lt 2 ]; then
+		echo Invalid usage of command, please reference --help.
+		exit 10
+	fi
+
+	ranks=$1
+	file=$2
+	shift 2
+	devices="${*:-cpu}"
+	echo Will use $ranks MPI ranks on: $devices
+
+	docker exec -i \
+		$CONTAINER_NAME \
+		bash -c "mpirun -n $ranks python3 ./main.py $file $devices"
+
+	exit 0
+
+fi
+
+
+if [[ $1 == "export" ]]; then
+
+	shift 1
+	if [ $# -lt 1 ]; then
+		echo Invalid usage of command, please reference --help.
+		exit 10
 	fi
 
-	gpu="${FREE_GPUS[0]}"
-	echo Will use GPU: $gpu
+	docker exec -i \
+		$CONTAINER_NAME \
+		bash -c "python3 ./main.py export $*"
+
+	exit 0
+
+fi
 
 
+if [[ $1 == "catalog" ]]; then
+
+	shift 1
 	docker exec -i \
 		$CONTAINER_NAME \
-		bash -c "python3 ./main.py $1 $gpu"
+		bash -c "python3 ./main.py catalog $(printf "%q " "$@")"
 
 	exit 0
 
 fi
 
+
+if [[ $1 == "plan" ]]; then
+
+	shift 1
+	if [ $# -lt 1 ]; then
+		echo Invalid usage of command, please reference --help.
+		exit 10
+	fi
+
+	docker exec -i \
+		$CONTAINER_NAME \
+		bash -c "python3 ./main.py plan $*"
+
+	exit 0
+
+fi
+
+
 echo "Command $1 not recognized. Type --help for help."
 exit 100
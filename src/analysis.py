@@ -0,0 +1,310 @@
+import os
+import abc
+import numpy as np
+from typing import List
+from .simulation import Simulation
+from . import mpi
+
+
+# Analyzers by the name used in the analysis section
+ANALYZERS = {}
+
+# Number of pair distances computed at once
+CHUNK = 1 << 22
+
+
+def register(name: str):
+    def decorator(cls):
+        cls.name = name
+        ANALYZERS[name] = cls
+        return cls
+    return decorator
+
+
+def check(config: List[dict]) -> None:
+    """Raise for unknown analyzers or missing periods."""
+    for item in config:
+        name, params = list(item.items())[0]
+        if name not in ANALYZERS:
+            raise Exception(f"Analyzer {name} not recognized.")
+        if params is None or "period" not in params:
+            raise Exception(f"Analyzer {name} requires a period.")
+
+
+def box_lengths(snap: "snapshot") -> np.array:
+    return np.array([snap.box.Lx, snap.box.Ly, snap.box.Lz])
+
+
+def pair_distances(a: np.array, b: np.array, L: np.array, r_max: float,
+                   same: bool=False):
+    """Yield (i, j, r) of the pairs of a and b closer than r_max, in
+    chunks of rows of a, with periodic boundaries."""
+    rows = max(CHUNK // max(len(b), 1), 1)
+    for start in range(0, len(a), rows):
+        d = b[None, :, :] - a[start:start+rows, None, :]
+        d -= L * np.round(d / L)
+        r = np.sqrt(np.einsum("ijk,ijk->ij", d, d))
+        close = r < r_max
+        if same:
+            i = np.arange(start, start + len(r))[:, None]
+            close &= np.arange(len(b))[None, :] > i
+        i, j = np.nonzero(close)
+        yield i + start, j, r[i, j]
+
+
+
+class Analyzer(abc.ABC):
+    """Base of the in-situ analyzers.
+
+    Analyzers are evaluated on a snapshot shared by all analyzers due at
+    the same step, and keep running sums only. Their state is written to
+    and read back from the analysis file as named arrays."""
+
+    name = None
+
+    def __init__(self, sim: Simulation, period: float, **params):
+        self.sim = sim
+        self.period = int(float(period))
+        self.params = params
+        self.frames = 0
+        self._masks = {}
+
+
+    def mask(self, snap: "snapshot", labels: List[str]) -> np.array:
+        """Particles of the given types, typeids do not change in a run."""
+        key = tuple(labels)
+        if key not in self._masks:
+            types = list(snap.particles.types)
+            ids = [types.index(label) for label in labels]
+            self._masks[key] = np.isin(snap.particles.typeid, ids)
+        return self._masks[key]
+
+
+    @abc.abstractmethod
+    def evaluate(self, snap: "snapshot", step: int) -> None:
+        pass
+
+
+    def state(self) -> dict:
+        return {"frames": np.array(self.frames)}
+
+
+    def load(self, state: dict) -> None:
+        self.frames = int(state["frames"])
+
+
+
+@register("rdf")
+class RDF(Analyzer):
+    """Radial distribution functions of type pairs,
+    `rdf: {period, pairs: [[A, B], ...], r_max, bins}`."""
+
+    def __init__(self, sim: Simulation, period: float, pairs: list,
+                 r_max: float=10., bins: int=100):
+        super().__init__(sim, period)
+        self.pairs = [tuple(pair) for pair in pairs]
+        self.edges = np.linspace(0., float(r_max), int(bins) + 1)
+        self.counts = np.zeros((len(self.pairs), int(bins)))
+        self.density = np.zeros(len(self.pairs))
+
+
+    def evaluate(self, snap: "snapshot", step: int) -> None:
+        L = box_lengths(snap)
+        position = snap.particles.position
+        for k, (a, b) in enumerate(self.pairs):
+            pa = position[self.mask(snap, [a])]
+            pb = position[self.mask(snap, [b])]
+            same = a == b
+            for _, _, r in pair_distances(pa, pb, L, self.edges[-1], same):
+                self.counts[k] += np.histogram(r, bins=self.edges)[0]
+            n_pairs = len(pa) * (len(pb) - 1) / 2. if same \
+                      else len(pa) * len(pb)
+            self.density[k] += n_pairs / np.prod(L)
+        self.frames += 1
+
+
+    def state(self) -> dict:
+        shell = 4. / 3. * np.pi * np.diff(self.edges**3)
+        norm = np.where(self.density > 0, self.density, 1.)[:, None] * shell
+        return {**super().state(), "r": 0.5 * (self.edges[1:]
+                                               + self.edges[:-1]),
+                "edges": self.edges, "counts": self.counts,
+                "density": self.density, "g": self.counts / norm,
+                "pairs": np.array(self.pairs)}
+
+
+    def load(self, state: dict) -> None:
+        super().load(state)
+        self.counts = state["counts"]
+        self.density = state["density"]
+
+
+
+@register("orientation")
+class Orientation(Analyzer):
+    """Orientational order of rigid bodies, the nematic order parameter
+    and the mean of the body axis, `orientation: {period, types, axis}`."""
+
+    def __init__(self, sim: Simulation, period: float, types: list=None,
+                 axis: list=(0., 0., 1.)):
+        super().__init__(sim, period)
+        self.types = types or [rb.get_center().label
+                               for rb in sim.list_unique_rigidbodies()]
+        self.axis = np.asarray(axis, dtype=float)
+        self.axis /= np.linalg.norm(self.axis)
+        self.steps, self.nematic, self.polar = [], [], []
+
+
+    def evaluate(self, snap: "snapshot", step: int) -> None:
+        q = snap.particles.orientation[self.mask(snap, self.types)]
+        if len(q) == 0: return
+        w, v = q[:, :1], q[:, 1:]
+        t = 2. * np.cross(v, self.axis)
+        n = self.axis + w * t + np.cross(v, t)
+        Q = 1.5 * np.einsum("ij,ik->jk", n, n) / len(n) - 0.5 * np.eye(3)
+        self.steps.append(step)
+        self.nematic.append(np.linalg.eigvalsh(Q)[-1])
+        self.polar.append(np.linalg.norm(n.mean(axis=0)))
+        self.frames += 1
+
+
+    def state(self) -> dict:
+        return {**super().state(), "step": np.array(self.steps, dtype=int),
+                "nematic": np.array(self.nematic),
+                "polar": np.array(self.polar)}
+
+
+    def load(self, state: dict) -> None:
+        super().load(state)
+        self.steps = state["step"].tolist()
+        self.nematic = state["nematic"].tolist()
+        self.polar = state["polar"].tolist()
+
+
+
+@register("clusters")
+class Clusters(Analyzer):
+    """Histogram of the sizes of clusters of particles closer than r_cut,
+    `clusters: {period, types, r_cut}`."""
+
+    def __init__(self, sim: Simulation, period: float, types: list=None,
+                 r_cut: float=6.):
+        super().__init__(sim, period)
+        self.types = types or [rb.get_center().label
+                               for rb in sim.list_unique_rigidbodies()]
+        self.r_cut = float(r_cut)
+        self.histogram = np.zeros(1)
+
+
+    @staticmethod
+    def labels(n: int, i: np.array, j: np.array) -> np.array:
+        """Connected components by propagating the smallest label."""
+        labels = np.arange(n)
+        while True:
+            low = np.minimum(labels[i], labels[j])
+            new = labels.copy()
+            np.minimum.at(new, i, low)
+            np.minimum.at(new, j, low)
+            new = new[new]
+            if np.array_equal(new, labels): return labels
+            labels = new
+
+
+    def evaluate(self, snap: "snapshot", step: int) -> None:
+        position = snap.particles.position[self.mask(snap, self.types)]
+        if len(position) == 0: return
+        L = box_lengths(snap)
+        pairs = [(i, j) for i, j, _ in pair_distances(position, position, L,
+                                                      self.r_cut, True)]
+        i = np.concatenate([p[0] for p in pairs])
+        j = np.concatenate([p[1] for p in pairs])
+        sizes = np.bincount(self.labels(len(position), i, j))
+        counts = np.bincount(sizes[sizes > 0])
+        if len(counts) > len(self.histogram):
+            self.histogram = np.pad(self.histogram,
+                                    (0, len(counts) - len(self.histogram)))
+        self.histogram[:len(counts)] += counts
+        self.frames += 1
+
+
+    def state(self) -> dict:
+        return {**super().state(), "histogram": self.histogram,
+                "size": np.arange(len(self.histogram))}
+
+
+    def load(self, state: dict) -> None:
+        super().load(state)
+        self.histogram = state["histogram"]
+
+
+
+class Analysis:
+    """Analyzers of the analysis section, attached to the run as a single
+    hoomd callback.
+
+    One snapshot is taken per step at which any analyzer is due and
+    shared between them. The state of all analyzers is saved to the
+    analysis file about every trajectory period, on a multiple of the
+    callback period, and at the end of the run. Continued runs resume
+    from it."""
+
+    def __init__(self, sim: Simulation, system: "system", offset: int=0):
+        self.sim = sim
+        self.system = system
+        self.offset = offset
+        self.analyzers = []
+        names = {}
+        for item in sim.analysis:
+            name, params = list(item.items())[0]
+            params = dict(params)
+            key = params.pop("name", None) or name
+            names[key] = names.get(key, -1) + 1
+            if names[key]: key = f"{key}{names[key]}"
+            self.analyzers.append((key, ANALYZERS[name](sim, **params)))
+        if sim.is_continue() and os.path.exists(sim.analysis_file):
+            self._load()
+
+
+    @property
+    def period(self) -> int:
+        """Period of the hoomd callback."""
+        return int(np.gcd.reduce([a.period for _, a in self.analyzers]))
+
+
+    @property
+    def save_period(self) -> int:
+        """First multiple of the callback period from the trajectory
+        period on, the callback is not called at other steps."""
+        return self.period * max(-(-int(self.sim.period) // self.period), 1)
+
+
+    def __call__(self, timestep: int) -> None:
+        due = [a for _, a in self.analyzers if timestep % a.period == 0]
+        if due:
+            # Taking the snapshot is collective, its data is on rank 0 only
+            snap = self.system.take_snapshot(particles=True)
+            if not mpi.is_root(): return
+            for analyzer in due:
+                analyzer.evaluate(snap, self.offset + timestep)
+        if timestep % self.save_period == 0:
+            self.save()
+
+
+    def _load(self) -> None:
+        with np.load(self.sim.analysis_file) as data:
+            for key, analyzer in self.analyzers:
+                prefix = f"{key}/"
+                state = {k[len(prefix):]: data[k] for k in data.files
+                         if k.startswith(prefix)}
+                if state: analyzer.load(state)
+
+
+    def save(self) -> None:
+        if not mpi.is_root(): return
+        arrays = {}
+        for key, analyzer in self.analyzers:
+            for name, value in analyzer.state().items():
+                arrays[f"{key}/{name}"] = value
+        tmp = self.sim.analysis_file + ".tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, self.sim.analysis_file)
@@ -0,0 +1,121 @@
+import os
+import json
+import struct
+import numpy as np
+from typing import List
+from . import mpi
+
+
+# File layout: MAGIC, header length (uint32), JSON header padded to a
+# multiple of 8 bytes, then rows of float64 values, one per column
+MAGIC = b"HLABLOG1"
+DTYPE = np.dtype("<f8")
+
+
+def _encode_header(columns: List[str]) -> bytes:
+    header = json.dumps({"columns": columns, "dtype": DTYPE.str}).encode()
+    start = len(MAGIC) + 4
+    header += b" " * (-(start + len(header)) % 8)
+    return MAGIC + struct.pack("<I", len(header)) + header
+
+
+def read_header(file: str) -> tuple:
+    """Columns of the log and the byte offset of the first row."""
+    with open(file, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise Exception(f"{file} is not a binary log.")
+        size, = struct.unpack("<I", f.read(4))
+        header = json.loads(f.read(size).decode())
+    return header["columns"], len(MAGIC) + 4 + size
+
+
+def nrows(file: str) -> int:
+    columns, start = read_header(file)
+    return (os.path.getsize(file) - start) // (len(columns) * DTYPE.itemsize)
+
+
+def read(file: str) -> np.array:
+    """Memory-mapped rows as a record array with one field per column."""
+    columns, start = read_header(file)
+    dtype = np.dtype([(c, DTYPE) for c in columns])
+    n = nrows(file)
+    if n == 0: return np.zeros(0, dtype=dtype)
+    return np.memmap(file, dtype=dtype, mode="r", offset=start, shape=(n,))
+
+
+def tail(file: str, offset: int=0) -> tuple:
+    """Rows added after row `offset` and the offset to pass next time."""
+    rows = read(file)
+    return np.array(rows[offset:]), len(rows)
+
+
+
+class BinaryLog:
+    """Append-only log of fixed width float64 rows.
+
+    Appending to an existing log requires the same columns, a partial
+    row left by an interrupted run is dropped."""
+
+    def __init__(self, file: str, columns: List[str],
+                 overwrite: bool=False):
+        self.file = file
+        self.columns = list(columns)
+        if overwrite or not os.path.exists(file):
+            with open(file, "wb") as f:
+                f.write(_encode_header(self.columns))
+        else:
+            columns, start = read_header(file)
+            if columns != self.columns:
+                raise Exception(f"Columns of {file} do not match the log.")
+            row = len(columns) * DTYPE.itemsize
+            size = os.path.getsize(file)
+            with open(file, "r+b") as f:
+                f.truncate(size - (size - start) % row)
+        self._f = open(file, "ab")
+
+
+    def append(self, values: List[float]) -> None:
+        if len(values) != len(self.columns):
+            raise Exception("Row does not match the columns of the log.")
+        self._f.write(np.asarray(values, dtype=DTYPE).tobytes())
+        self._f.flush()
+
+
+    def close(self) -> None:
+        self._f.close()
+
+
+    def __enter__(self) -> "BinaryLog":
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+
+
+class QueryLog:
+    """hoomd callback writing the quantities of a logger to a binary log.
+
+    Timesteps are logged with the step the segment started from added,
+    so they are counted across the segments of continued runs."""
+
+    def __init__(self, logger: "log", quantities: List[str], file: str,
+                 overwrite: bool=False, offset: int=0):
+        self.logger = logger
+        self.quantities = quantities
+        self.offset = offset
+        self.log = None
+        if mpi.is_root():
+            self.log = BinaryLog(file, ["timestep"] + quantities, overwrite)
+
+
+    def __call__(self, timestep: int) -> None:
+        # Queries are reduced over all ranks, rank 0 writes
+        values = [self.logger.query(q) for q in self.quantities]
+        if self.log is not None:
+            self.log.append([self.offset + timestep] + values)
+
+
+    def close(self) -> None:
+        if self.log is not None: self.log.close()
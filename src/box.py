@@ -4,6 +4,8 @@ from dataclasses import dataclass
 @dataclass
 class Box:
 
+    __slots__ = ("Lx", "Ly", "Lz")
+
     Lx: int
     Ly: int
     Lz: int
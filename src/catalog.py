@@ -0,0 +1,235 @@
+import os
+import re
+import json
+import sqlite3
+import datetime
+from typing import List
+from .simulation import Simulation
+from .parser import Parser
+from .trajectory import FrameIndex
+from .utils import CATALOG_FILE, SIMULATIONS_DIR
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    file TEXT PRIMARY KEY,
+    project TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    kT REAL, dt REAL, seed INTEGER, period REAL, duration REAL,
+    forked_from TEXT, forked_frame INTEGER, forked_step INTEGER,
+    params TEXT,
+    status TEXT,
+    frames INTEGER,
+    final_step INTEGER
+);
+CREATE TABLE IF NOT EXISTS segments (
+    file TEXT NOT NULL REFERENCES runs(file),
+    segment INTEGER NOT NULL,
+    action TEXT,
+    continuation_of TEXT,
+    start_frame INTEGER,
+    duration REAL,
+    started TEXT,
+    finished TEXT,
+    status TEXT,
+    frames INTEGER,
+    final_step INTEGER,
+    PRIMARY KEY (file, segment)
+);
+CREATE INDEX IF NOT EXISTS runs_project ON runs(project);
+CREATE INDEX IF NOT EXISTS runs_forked_from ON runs(forked_from);
+CREATE INDEX IF NOT EXISTS runs_kT ON runs(kT);
+CREATE INDEX IF NOT EXISTS runs_dt ON runs(dt);
+"""
+
+# Columns that can be filtered on from the command line
+COLUMNS = ("project", "timestamp", "kT", "dt", "seed", "period",
+           "duration", "forked_from", "status", "frames", "final_step")
+
+
+def _now() -> str:
+    return datetime.datetime.now().isoformat(timespec="seconds")
+
+
+def parse_filter(expr: str) -> tuple:
+    """(column, operator, value) of an expression like "kT<=0.1"."""
+    match = re.match(r"^(\w+)(<=|>=|!=|=|<|>)(.+)$", expr)
+    if match is None or match.group(1) not in COLUMNS:
+        raise Exception(f"Filter {expr} not recognized.")
+    column, op, value = match.groups()
+    try:
+        value = float(value)
+    except ValueError:
+        pass
+    return column, op, value
+
+
+
+class Catalog:
+    """SQLite index of the runs in the simulations directory.
+
+    A run is identified by its yaml file name, continued runs append
+    segments to it. Forks link to the file they were forked from."""
+
+    def __init__(self, file: str=CATALOG_FILE):
+        self.file = file
+        self.db = sqlite3.connect(file, timeout=30.)
+        self.db.row_factory = sqlite3.Row
+        self.db.executescript(SCHEMA)
+
+
+    def __enter__(self) -> "Catalog":
+        return self
+
+
+    def __exit__(self, *args) -> None:
+        self.db.close()
+
+
+    def _trajectory_state(self, sim: Simulation) -> tuple:
+        if not os.path.exists(sim.trajectory_file): return 0, None
+        index = FrameIndex(sim.trajectory_file)
+        index.update()
+        if index.nframes == 0: return 0, None
+        return index.nframes, index.step(-1)
+
+
+    def add_run(self, sim: Simulation, status: str=None) -> None:
+        fork = sim.forked_from
+        with self.db:
+            self.db.execute(
+                "INSERT INTO runs (file, project, timestamp, kT, dt, seed, "
+                "period, duration, forked_from, forked_frame, forked_step, "
+                "params, status) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?) "
+                "ON CONFLICT(file) DO UPDATE SET duration=excluded.duration, "
+                "params=excluded.params, status=excluded.status",
+                (sim.project_filename, sim.project, sim.timestamp,
+                 float(sim.kT), float(sim.dt), int(sim.seed),
+                 sim.period, sim.total_duration,
+                 fork.file if fork else None,
+                 fork.frame if fork else None,
+                 fork.step if fork else None,
+                 json.dumps(sim.as_dict()), status))
+
+
+    def start(self, sim: Simulation) -> None:
+        """Record the start of a run or of a continued segment."""
+        self.add_run(sim, status="running")
+        continued = sim.continuation_of
+        with self.db:
+            segment = self.db.execute(
+                "SELECT COUNT(*) FROM segments WHERE file=?",
+                (sim.project_filename,)).fetchone()[0]
+            self.db.execute(
+                "INSERT INTO segments (file, segment, action, "
+                "continuation_of, start_frame, duration, started, status) "
+                "VALUES (?,?,?,?,?,?,?,?)",
+                (sim.project_filename, segment, sim.simtype.value,
+                 continued.file if continued else None,
+                 sim.start_from if not sim.is_run() else None,
+                 sim.duration, _now(), "running"))
+
+
+    def finish(self, sim: Simulation, status: str="finished") -> None:
+        """Record the end of the last segment with the frame count and
+        final step of the trajectory."""
+        frames, final_step = self._trajectory_state(sim)
+        with self.db:
+            self.db.execute(
+                "UPDATE runs SET status=?, frames=?, final_step=? "
+                "WHERE file=?",
+                (status, frames, final_step, sim.project_filename))
+            self.db.execute(
+                "UPDATE segments SET finished=?, status=?, frames=?, "
+                "final_step=? WHERE file=? AND segment=(SELECT MAX(segment) "
+                "FROM segments WHERE file=?)",
+                (_now(), status, frames, final_step,
+                 sim.project_filename, sim.project_filename))
+
+
+    def runs(self, filters: List[tuple]=()) -> List[sqlite3.Row]:
+        where = " AND ".join(f"{c} {op} ?" for c, op, _ in filters)
+        query = "SELECT * FROM runs"
+        if where: query += f" WHERE {where}"
+        query += " ORDER BY timestamp"
+        return self.db.execute(query, [v for *_, v in filters]).fetchall()
+
+
+    def get(self, file: str) -> sqlite3.Row:
+        return self.db.execute("SELECT * FROM runs WHERE file=?",
+                               (file,)).fetchone()
+
+
+    def segments(self, file: str) -> List[sqlite3.Row]:
+        return self.db.execute(
+            "SELECT * FROM segments WHERE file=? ORDER BY segment",
+            (file,)).fetchall()
+
+
+    def ancestors(self, file: str) -> List[str]:
+        """Files the run was forked from, oldest first."""
+        chain = []
+        run = self.get(file)
+        while run is not None and run["forked_from"] is not None:
+            chain.insert(0, run["forked_from"])
+            run = self.get(run["forked_from"])
+        return chain
+
+
+    def children(self, file: str) -> List[str]:
+        return [row["file"] for row in self.db.execute(
+            "SELECT file FROM runs WHERE forked_from=? ORDER BY timestamp",
+            (file,))]
+
+
+    def lineage(self, file: str) -> List[tuple]:
+        """(depth, file) of the runs forked from the root of `file`."""
+        root = (self.ancestors(file) or [file])[0]
+        tree, stack = [], [(0, root)]
+        while stack:
+            depth, current = stack.pop()
+            tree.append((depth, current))
+            children = self.children(current)
+            stack += [(depth + 1, c) for c in reversed(children)]
+        return tree
+
+
+    def scan(self, path: str=SIMULATIONS_DIR) -> int:
+        """Add the runs written to `path` before the catalog existed."""
+        added = 0
+        for fname in sorted(os.listdir(path)):
+            if not fname.endswith(".yaml") or self.get(fname) is not None:
+                continue
+            try:
+                sim = Parser(fname, abs_path=path).simulation
+                sim.project_filename = fname
+            except Exception:
+                continue
+            sim.path = path
+            self.add_run(sim)
+            frames, final_step = self._trajectory_state(sim)
+            with self.db:
+                self.db.execute(
+                    "UPDATE runs SET frames=?, final_step=? WHERE file=?",
+                    (frames, final_step, fname))
+            added += 1
+        return added
+
+
+
+def record_start(sim: Simulation) -> None:
+    """Catalog the start of a run, a catalog that can not be written does
+    not stop the run."""
+    try:
+        with Catalog() as catalog:
+            catalog.start(sim)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Run was not added to the catalog: {e}")
+
+
+def record_finish(sim: Simulation, status: str="finished") -> None:
+    try:
+        with Catalog() as catalog:
+            catalog.finish(sim, status)
+    except (sqlite3.Error, OSError) as e:
+        print(f"Run was not updated in the catalog: {e}")
@@ -0,0 +1,139 @@
+import os
+from typing import List
+from dataclasses import dataclass
+
+
+def parse_cores(raw: any) -> List[int]:
+    """Core list from a list of ids or a string like "0-3,8,10-11"."""
+    if raw is None: return None
+    if isinstance(raw, int): return [raw]
+    if isinstance(raw, list): return [int(c) for c in raw]
+    cores = []
+    for part in str(raw).split(","):
+        if "-" in part:
+            low, high = part.split("-")
+            cores += list(range(int(low), int(high) + 1))
+        else:
+            cores.append(int(part))
+    return cores
+
+
+
+@dataclass
+class Device:
+
+    mode: str = "gpu"
+    gpu: int = 0
+    threads: int = None
+    cores: List[int] = None
+
+
+    def __post_init__(self):
+        if self.mode not in ("gpu", "cpu"):
+            raise Exception(f"Device mode {self.mode} not recognized.")
+        self.gpu = int(self.gpu)
+        self.cores = parse_cores(self.cores)
+        if self.threads is None and self.cores is not None:
+            self.threads = len(self.cores)
+        if self.threads is not None:
+            self.threads = int(self.threads)
+
+
+    def __str__(self) -> str:
+        if self.is_gpu(): return f"GPU {self.gpu}"
+        desc = "CPU"
+        if self.threads is not None: desc += f" ({self.threads} threads"
+        if self.cores is not None: desc += f" on cores {self.cores}"
+        if self.threads is not None: desc += ")"
+        return desc
+
+
+    @staticmethod
+    def from_spec(spec: str) -> "Device":
+        """Device from a command line spec.
+
+        Accepted forms: "<gpu>", "gpu:<gpu>", "cpu", "cpu:<threads>" and
+        "cpu:<threads>:<cores>", with cores as in parse_cores."""
+        parts = str(spec).split(":")
+        if parts[0].isdigit():
+            return Device(mode="gpu", gpu=int(parts[0]))
+        if parts[0] == "gpu":
+            gpu = int(parts[1]) if len(parts) > 1 else 0
+            return Device(mode="gpu", gpu=gpu)
+        if parts[0] == "cpu":
+            threads = int(parts[1]) if len(parts) > 1 and parts[1] else None
+            cores = parts[2] if len(parts) > 2 else None
+            return Device(mode="cpu", threads=threads, cores=cores)
+        raise Exception(f"Device spec {spec} not recognized.")
+
+
+    @staticmethod
+    def partition(slots: int) -> List["Device"]:
+        """Split the cores available to this process into disjoint
+        CPU devices."""
+        available = sorted(os.sched_getaffinity(0))
+        if slots > len(available):
+            raise Exception("More CPU slots requested than cores available.")
+        size = len(available) // slots
+        return [Device(mode="cpu", cores=available[i*size:(i+1)*size])
+                for i in range(slots)]
+
+
+    def is_gpu(self) -> bool:
+        if self.mode == "gpu": return True
+        return False
+
+
+    def is_cpu(self) -> bool:
+        if self.mode == "cpu": return True
+        return False
+
+
+    def bind(self) -> None:
+        """Pin the current process to the device's cores."""
+        if self.is_cpu() and self.cores is not None:
+            os.sched_setaffinity(0, self.cores)
+
+
+    @property
+    def context_args(self) -> str:
+        if self.is_gpu():
+            return f"--mode=gpu --gpu={self.gpu}"
+        args = "--mode=cpu"
+        if self.threads is not None:
+            args += f" --nthreads={self.threads}"
+        return args
+
+
+    def as_dict(self) -> dict:
+        if self.is_gpu():
+            return {"mode": self.mode, "gpu": self.gpu}
+        data = {"mode": self.mode}
+        if self.threads is not None: data["threads"] = self.threads
+        if self.cores is not None: data["cores"] = self.cores
+        return data
+
+
+
+def from_specs(specs: List[str]) -> List[Device]:
+    """Devices from command line specs, "cpu/<n>" splits the available
+    cores into n disjoint slots."""
+    devices = []
+    for spec in specs:
+        if str(spec).startswith("cpu/"):
+            devices += Device.partition(int(spec.split("/")[1]))
+        else:
+            devices.append(Device.from_spec(spec))
+    check_disjoint(devices)
+    return devices
+
+
+
+def check_disjoint(devices: List[Device]) -> None:
+    """Raise if devices would share a GPU or CPU core."""
+    gpus = [d.gpu for d in devices if d.is_gpu()]
+    if len(gpus) != len(set(gpus)):
+        raise Exception("The same GPU was given more than once.")
+    cores = [c for d in devices if d.is_cpu() and d.cores for c in d.cores]
+    if len(cores) != len(set(cores)):
+        raise Exception("CPU devices share cores.")
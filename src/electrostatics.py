@@ -0,0 +1,88 @@
+import math
+import numpy as np
+from .simulation import Simulation
+
+
+# Leading coefficients of the PPPM k-space error estimate per order,
+# Deserno and Holm, J. Chem. Phys. 109, 7694 (1998)
+ACONS = {1: 2/3., 2: 1/50., 3: 1/588., 4: 1/4320., 5: 1/23232.,
+         6: 691/68140800., 7: 1/345600.}
+
+DEFAULT_ACCURACY = 1e-4
+DEFAULT_ORDER = 5
+DEFAULT_RCUT = 6.
+MAX_GRID = 512
+
+
+def charges(sim: Simulation) -> tuple:
+    """Number of particles, sum of squared charges and whether any
+    particle carries a charge."""
+    natoms, q2, charged = 0, 0., False
+    for rb, _, count in sim.iter_rigidbodies():
+        natoms += count * len(rb)
+        q2 += count * float(np.sum(rb.charges**2))
+        charged = charged or (count > 0 and bool(np.any(rb.charges != 0)))
+    for sol, _, count in sim.iter_solvents():
+        natoms += count
+        q2 += count * sol.q**2
+        charged = charged or (count > 0 and sol.q != 0)
+    return natoms, q2, charged
+
+
+def has_charges(sim: Simulation) -> bool:
+    return charges(sim)[2]
+
+
+def real_space_splitting(accuracy: float, rcut: float, natoms: int,
+                         q2: float, volume: float) -> float:
+    """Ewald splitting parameter for the real-space error estimate of
+    Kolafa and Perram, Mol. Simul. 9, 351 (1992)."""
+    g = accuracy * math.sqrt(natoms * rcut * volume) / (2. * q2)
+    if g >= 1.: return (1.35 - 0.15 * math.log(accuracy)) / rcut
+    return math.sqrt(-math.log(g)) / rcut
+
+
+def kspace_error(h: float, length: float, g: float, order: int,
+                 natoms: int, q2: float) -> float:
+    """Force error of the k-space part along one box dimension with
+    grid spacing h."""
+    hg = h * g
+    return q2 * hg**order * math.sqrt(g * length * math.sqrt(2 * math.pi)
+                                      * ACONS[order] / natoms) / length**2
+
+
+def fft_size(n: int) -> int:
+    """Smallest number >= n with only 2, 3 and 5 as prime factors."""
+    while True:
+        m = n
+        for p in (2, 3, 5):
+            while m % p == 0: m //= p
+        if m == 1: return n
+        n += 1
+
+
+def pppm_params(sim: Simulation) -> dict:
+    """Grid, order and cutoff of PPPM for the accuracy set in the
+    simulation section, `pppm: {accuracy, order, rcut}`."""
+    config = sim.pppm or {}
+    accuracy = float(config.get("accuracy", DEFAULT_ACCURACY))
+    order = int(config.get("order", DEFAULT_ORDER))
+    rcut = float(config.get("rcut", DEFAULT_RCUT))
+    if order not in ACONS:
+        raise Exception(f"PPPM order must be between 1 and 7, got {order}.")
+
+    natoms, q2, _ = charges(sim)
+    lengths = [sim.box.Lx, sim.box.Ly, sim.box.Lz]
+    volume = lengths[0] * lengths[1] * lengths[2]
+    g = real_space_splitting(accuracy, rcut, natoms, q2, volume)
+
+    grid = []
+    for length in lengths:
+        n = max(int(math.ceil(length * g / 4.)), 1)
+        while kspace_error(length / n, length, g, order, natoms, q2) \
+                > accuracy and n < MAX_GRID:
+            n = int(math.ceil(n / 0.95))
+        grid.append(min(fft_size(n), MAX_GRID))
+
+    return {"Nx": grid[0], "Ny": grid[1], "Nz": grid[2],
+            "order": order, "rcut": rcut}
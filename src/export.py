@@ -0,0 +1,133 @@
+import os
+import json
+import shutil
+import multiprocessing as mp
+import numpy as np
+import gsd.hoomd
+from typing import List
+from .simulation import Simulation
+from .trajectory import FrameIndex
+
+
+# Per-frame fields written for every chunk, static fields are written
+# once from the first exported frame. Image flags are not exported, the
+# trajectory holds them in its first frame only.
+FIELDS = ("position", "orientation")
+STATIC = ("typeid", "charge", "diameter", "mass", "moment_inertia")
+MANIFEST = "export.json"
+
+
+def export_dir(sim: Simulation) -> str:
+    return os.path.join(sim.path,
+                        f"{sim.project}_{sim.timestamp}.export")
+
+
+def _save(file: str, array: np.array) -> None:
+    tmp = file + ".tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, file)
+
+
+def _decode(job: tuple) -> dict:
+    """Decode frames [start, stop) of the trajectory into one file per
+    field, keeping the particles of the given type ids."""
+    trajectory_file, out, chunk, start, stop, keep_ids = job
+    with gsd.hoomd.open(trajectory_file, mode="rb") as trajectory:
+        frames = [trajectory[i] for i in range(start, stop)]
+    masks = [np.isin(f.particles.typeid, keep_ids) for f in frames]
+    if len(set(int(m.sum()) for m in masks)) > 1:
+        raise Exception(f"Frames {start}-{stop} differ in particle count.")
+
+    files = {}
+    for name in FIELDS:
+        data = np.stack([getattr(f.particles, name)[m]
+                         for f, m in zip(frames, masks)])
+        files[name] = f"{name}.{chunk:05d}.npy"
+        _save(os.path.join(out, files[name]), data)
+    return {"chunk": chunk, "start": start, "stop": stop, "files": files}
+
+
+def _write_static(trajectory_file: str, out: str, frame: int,
+                  keep_ids: List[int]) -> None:
+    with gsd.hoomd.open(trajectory_file, mode="rb") as trajectory:
+        f = trajectory[frame]
+    mask = np.isin(f.particles.typeid, keep_ids)
+    for name in STATIC:
+        _save(os.path.join(out, f"{name}.npy"),
+              getattr(f.particles, name)[mask])
+
+
+def _read_manifest(out: str) -> dict:
+    file = os.path.join(out, MANIFEST)
+    if not os.path.exists(file): return None
+    with open(file, "r") as f:
+        return json.load(f)
+
+
+def _write_manifest(out: str, manifest: dict) -> None:
+    tmp = os.path.join(out, MANIFEST + ".tmp")
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=1)
+    os.replace(tmp, os.path.join(out, MANIFEST))
+
+
+def export(sim: Simulation, types: List[str]=None, chunk: int=100,
+           workers: int=None) -> dict:
+    """Export the trajectory of a simulation to chunked NumPy arrays.
+
+    Frames are split into ranges of `chunk` frames and decoded on a pool
+    of worker processes. Only the particles of `types` are kept, by
+    default the rigid centers and the solvent. Frames exported before
+    are skipped, a change of types starts the export over. Returns the
+    manifest, which lists the chunks with their frame ranges."""
+    if types is None: types = sim.keep_particles
+    types = sorted(set(types))
+    index = FrameIndex(sim.trajectory_file)
+    index.update()
+
+    out = export_dir(sim)
+    manifest = _read_manifest(out)
+    if manifest is not None and (manifest["types"] != types
+                                 or manifest["frames"] > index.nframes):
+        shutil.rmtree(out)
+        manifest = None
+    os.makedirs(out, exist_ok=True)
+    if manifest is None:
+        manifest = {"trajectory": os.path.basename(sim.trajectory_file),
+                    "types": types, "frames": 0, "chunks": []}
+
+    start = manifest["frames"]
+    if start == index.nframes: return manifest
+
+    with gsd.hoomd.open(sim.trajectory_file, mode="rb") as trajectory:
+        all_types = list(trajectory[0].particles.types)
+    keep_ids = [i for i, t in enumerate(all_types) if t in types]
+    if start == 0:
+        _write_static(sim.trajectory_file, out, 0, keep_ids)
+
+    first = len(manifest["chunks"])
+    jobs = [(sim.trajectory_file, out, first + k, s,
+             min(s + chunk, index.nframes), keep_ids)
+            for k, s in enumerate(range(start, index.nframes, chunk))]
+
+    ctx = mp.get_context("spawn")
+    with ctx.Pool(processes=min(workers or os.cpu_count(), len(jobs))) \
+            as pool:
+        chunks = sorted(pool.imap_unordered(_decode, jobs),
+                        key=lambda c: c["chunk"])
+
+    for c in chunks:
+        c["steps"] = index.steps[c["start"]:c["stop"]]
+    manifest["chunks"] += chunks
+    manifest["frames"] = index.nframes
+    _write_manifest(out, manifest)
+    return manifest
+
+
+def load(out: str, name: str) -> any:
+    """Memory-mapped chunks of a per-frame field, or the static field."""
+    if name in STATIC:
+        return np.load(os.path.join(out, f"{name}.npy"), mmap_mode="r")
+    manifest = _read_manifest(out)
+    return [np.load(os.path.join(out, c["files"][name]), mmap_mode="r")
+            for c in manifest["chunks"]]
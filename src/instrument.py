@@ -0,0 +1,98 @@
+import json
+import time
+import datetime
+import resource
+from . import mpi
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process in MiB."""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.
+
+
+
+class Instrumentation:
+    """Wall time and peak memory of the phases of a run, and the
+    progress of hoomd.run, written as JSON lines.
+
+    Phases are consecutive, starting a phase ends the previous one.
+    Records made before a file is set are kept and written once it is."""
+
+    def __init__(self, file: str=None):
+        self.file = file
+        self._pending = []
+        self._phase = None
+        self._run = None
+        self._last = None
+
+
+    def set_file(self, file: str) -> None:
+        self.file = file
+        pending, self._pending = self._pending, []
+        for entry in pending:
+            self._write(entry)
+
+
+    def _write(self, entry: dict) -> None:
+        if not mpi.is_root(): return
+        if self.file is None:
+            self._pending.append(entry)
+            return
+        with open(self.file, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+
+
+    def record(self, event: str, **data) -> dict:
+        entry = {"event": event,
+                 "time": datetime.datetime.now().isoformat(),
+                 "peak_rss_mb": round(peak_rss_mb(), 1)}
+        entry.update(data)
+        self._write(entry)
+        return entry
+
+
+    def phase(self, name: str) -> None:
+        now = time.perf_counter()
+        self.end_phase(now)
+        self._phase = (name, now)
+
+
+    def end_phase(self, now: float=None) -> None:
+        if self._phase is None: return
+        if now is None: now = time.perf_counter()
+        name, start = self._phase
+        self._phase = None
+        self.record("phase", phase=name, seconds=now - start)
+
+
+    def start_run(self, timestep: int, steps: int) -> None:
+        now = time.perf_counter()
+        self._run = (now, timestep, steps)
+        self._last = (now, timestep)
+
+
+    def sample(self, timestep: int) -> None:
+        """Progress callback for hoomd.analyze.callback."""
+        if self._run is None: return
+        now = time.perf_counter()
+        start, first, steps = self._run
+        last, last_step = self._last
+        self._last = (now, timestep)
+        done = timestep - first
+        tps = (timestep - last_step) / (now - last) if now > last else None
+        mean_tps = done / (now - start) if now > start else None
+        eta = (steps - done) / mean_tps if mean_tps else None
+        self.record("progress", timestep=timestep, steps_done=done,
+                    tps=tps, mean_tps=mean_tps, eta_seconds=eta)
+
+
+    def end_run(self, timestep: int, **data) -> dict:
+        if self._run is None: return None
+        start, first, steps = self._run
+        seconds = time.perf_counter() - start
+        done = timestep - first
+        entry = self.record("run", steps=done, seconds=seconds,
+                            mean_tps=done / seconds if seconds > 0 else None,
+                            **data)
+        self._run = None
+        return entry
@@ -1,26 +1,86 @@
-from dataclasses import dataclass
+# Cutoff of pairs without a cutoff policy, in absolute units
+DEFAULT_R_CUT = 6.
+CUTOFF_POLICIES = ("wca", "n_sigma", "explicit")
 
 
-@dataclass
 class Interaction:
 
-    p1_label: str
-    p2_label: str
-    epsilon: float
-    sigma: float
-    alpha: float
+    __slots__ = ("p1_label", "p2_label", "epsilon", "sigma", "alpha",
+                 "cutoff", "r_cut", "n_sigma")
 
 
-    def __post_init__(self):
-        self.epsilon = float(self.epsilon)
-        self.sigma = float(self.sigma)
-        self.alpha = float(self.alpha)
+    def __init__(self, p1_label: str, p2_label: str, epsilon: float,
+                 sigma: float, alpha: float, cutoff: str=None,
+                 r_cut: float=None, n_sigma: float=None):
+        self.p1_label = p1_label
+        self.p2_label = p2_label
+        self.epsilon = float(epsilon)
+        self.sigma = float(sigma)
+        self.alpha = float(alpha)
+        self.cutoff = cutoff
+        self.r_cut = None if r_cut is None else float(r_cut)
+        self.n_sigma = None if n_sigma is None else float(n_sigma)
+        if cutoff is not None and cutoff not in CUTOFF_POLICIES:
+            raise Exception(f"Cutoff policy {cutoff} not recognized.")
+        if cutoff == "n_sigma" and self.n_sigma is None:
+            raise Exception("Cutoff policy n_sigma requires n_sigma.")
+        if cutoff == "explicit" and self.r_cut is None:
+            raise Exception("Cutoff policy explicit requires r_cut.")
+
+
+    def __repr__(self) -> str:
+        return (f"Interaction(p1_label={self.p1_label!r}, "
+                f"p2_label={self.p2_label!r}, epsilon={self.epsilon}, "
+                f"sigma={self.sigma}, alpha={self.alpha}, "
+                f"cutoff={self.cutoff!r}, r_cut={self.r_cut}, "
+                f"n_sigma={self.n_sigma})")
+
+
+    @staticmethod
+    def pair_key(p1_label: str, p2_label: str) -> tuple:
+        return tuple(sorted((p1_label, p2_label)))
+
+
+    @property
+    def pair(self) -> tuple:
+        return self.pair_key(self.p1_label, self.p2_label)
+
+
+    @property
+    def cutoff_radius(self) -> float:
+        """Cutoff of the pair, 0 for pairs without interaction."""
+        if self.epsilon == 0: return 0.
+        if self.cutoff == "wca": return 2**(1/6.) * self.sigma
+        if self.cutoff == "n_sigma": return self.n_sigma * self.sigma
+        if self.r_cut is not None: return self.r_cut
+        return DEFAULT_R_CUT
 
 
     def as_dict(self) -> dict:
-        return {self.p1_label:
-            {"with": [self.p2_label],
-             "epsilon": self.epsilon,
-             "sigma": self.sigma,
-             "alpha": self.alpha,}
-        }
+        data = {"with": [self.p2_label],
+                "epsilon": self.epsilon,
+                "sigma": self.sigma,
+                "alpha": self.alpha,}
+        if self.cutoff is not None: data["cutoff"] = self.cutoff
+        if self.r_cut is not None: data["r_cut"] = self.r_cut
+        if self.n_sigma is not None: data["n_sigma"] = self.n_sigma
+        return {self.p1_label: data}
+
+
+
+def shift_mode(interactions: list) -> str:
+    """Energy shift mode of the LJ potential, which hoomd applies to all
+    pairs. Pairs are shifted only if all interacting pairs are WCA, in
+    mixed sets the WCA pairs are not shifted either: their forces vanish
+    at the cutoff and only their logged energies are offset by epsilon."""
+    cutoffs = [i.cutoff for i in interactions if i.epsilon != 0]
+    if cutoffs and all(c == "wca" for c in cutoffs): return "shift"
+    return "no_shift"
+
+
+
+def max_cutoff(interactions: list) -> float:
+    """Cutoff of the LJ potential, the largest of its pairs.
+    DEFAULT_R_CUT when there are no pairs or none of them interacts."""
+    return max([i.cutoff_radius for i in interactions], default=0.) \
+           or DEFAULT_R_CUT
@@ -5,34 +5,54 @@ from .interaction import Interaction
 
 
 class StructList:
+    """Items indexed by their label, a later item replaces an earlier
+    one with the same label."""
 
 
     STRUCT_TYPE = any
 
 
     def __init__(self):
-        self._items = []
+        self._items = {}
 
 
     def __repr__(self):
-        return "["+ ", ".join(self.labels) +"]"
+        return "["+ ", ".join(str(label) for label in self.labels) +"]"
+
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+    def __contains__(self, label: any) -> bool:
+        return label in self._items
+
+
+    @staticmethod
+    def key(item: any) -> any:
+        return item.label
 
 
     @property
-    def labels(self) -> List[str]:
-        return [item.label for item in self._items]
+    def labels(self) -> List[any]:
+        return list(self._items)
 
 
     def add(self, item: any) -> None:
         if not isinstance(item, self.STRUCT_TYPE):
             raise Exception("Unable to add, invalid type.")
-        self._items.append(item)
+        self._items[self.key(item)] = item
 
 
-    def get(self, label: str) -> any:
-        for item in self._items:
-            if item.label == label: return item
-        raise Exception(f"Item with label {label} was not found.")
+    def get(self, label: any) -> any:
+        try:
+            return self._items[label]
+        except KeyError:
+            raise Exception(f"Item with label {label} was not found.")
 
 
 
@@ -49,5 +69,15 @@ class RigidBodyList(StructList):
 
 
 class InteractionList(StructList):
+    """Interactions indexed by their unordered pair of particle labels."""
 
     STRUCT_TYPE = Interaction
+
+
+    @staticmethod
+    def key(item: Interaction) -> tuple:
+        return item.pair
+
+
+    def get_pair(self, p1_label: str, p2_label: str) -> Interaction:
+        return self.get(Interaction.pair_key(p1_label, p2_label))
@@ -1,9 +1,15 @@
+import fcntl
 from .utils import LOG_FILE
 
 def log_current_file(fname: str, gpu: int) -> None:
-    with open(LOG_FILE, "r") as log:
-        raw = log.read()
-    files = raw.split(",")
-    files[gpu] = fname
-    with open(LOG_FILE, "w") as log:
+    # Sweep workers update their slots in parallel, the lock keeps the
+    # read and write of one worker from interleaving with another
+    with open(LOG_FILE, "a+") as log:
+        fcntl.flock(log, fcntl.LOCK_EX)
+        log.seek(0)
+        files = log.read().split(",")
+        files += [""] * (gpu + 1 - len(files))
+        files[gpu] = fname
+        log.seek(0)
+        log.truncate()
         log.write(",".join(files))
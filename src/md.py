@@ -4,87 +4,174 @@ import hoomd.md
 from .simulation import Simulation
 from . import log
 from . import utils
+from . import electrostatics
+from . import restart
+from . import analysis
+from . import output
+from . import binlog
+from . import mpi
+from . import catalog
+from . import plan
 from .yaml_keys import SimType
-from .snapshot import create_snapshot
+from .snapshot import create_snapshot, empty_snapshot
+from .device import Device
+from .instrument import Instrumentation
+from .trajectory import FrameIndex
+from .interaction import max_cutoff, shift_mode
 from src.parser import Parser
 
 
-def mdrun(sim: Simulation, gpu: int) -> None:
+def mdrun(sim: Simulation, device: Device, instr: Instrumentation=None,
+          frame: "frame"=None) -> None:
 
 
+    # Runs estimated to exceed their limits on this device are not started
+    plan.enforce(sim, device, mpi.size())
+
     # Write logs
-    sim.try_minting()
-    Parser.write(sim, sim.project_file)
-    log.log_current_file(sim.project_file, gpu)
+    if instr is None: instr = Instrumentation()
+    # Only rank 0 mints and writes, the other ranks take its timestamp
+    instr.phase("manifest")
+    if mpi.is_root():
+        sim.try_minting()
+    sim.timestamp = mpi.bcast(sim.timestamp)
+    if mpi.is_root():
+        instr.set_file(sim.profile_file)
+        Parser.write(sim, sim.project_file)
+        if device.is_gpu():
+            log.log_current_file(sim.project_file, device.gpu)
+        catalog.record_start(sim)
 
 
     # Init context
+    instr.phase("context")
     np.random.seed(sim.seed)
-    hoomd.context.initialize(f"--gpu={gpu}")
+    if not mpi.is_parallel():
+        device.bind()
+    hoomd.context.initialize(device.context_args)
 
 
     # Create starting snapshot
-    snapshot = create_snapshot(sim)
+    # hoomd distributes the snapshot of rank 0 over the domains
+    instr.phase("snapshot")
+    if mpi.is_root():
+        snapshot = create_snapshot(sim, frame)
+    else:
+        snapshot = empty_snapshot(sim)
 
 
     # Init system
+    instr.phase("init")
     hoomd_sys = hoomd.init.read_snapshot(snapshot)
 
 
     # Create rigid bodies
+    instr.phase("rigid_bodies")
     rigid = hoomd.md.constrain.rigid()
-    for rbdata in sim.rigidbodies:
-        rb = rbdata["rb"]
+    for rb in sim.list_unique_rigidbodies():
         center_label = rb.get_center().label
-        aux = rb.get_non_center()
-        types = [p.label for p in aux]
-        positions = [p.position for p in aux]
-        charges = [p.q for p in aux]
+        aux = ~rb.is_center
+        types = [rb.types[t].label for t in rb.typeids[aux]]
+        positions = rb.body_positions[aux].tolist()
+        charges = rb.charges[aux].tolist()
         rigid.set_param(center_label, types=types,
                         positions=positions, charges=charges)
     rigid.create_bodies()
 
 
     # Interactions
+    instr.phase("pair")
     nl = hoomd.md.nlist.cell()
-    lj = hoomd.md.pair.lj(r_cut=6, nlist=nl)
+    r_cut = max_cutoff(sim.interactions)
+    lj = hoomd.md.pair.lj(r_cut=r_cut, nlist=nl)
+    lj.set_params(mode=shift_mode(sim.interactions))
 
+    # Pairs with zero cutoff are left out of the neighbour list
     for i in sim.interactions:
         lj.pair_coeff.set(i.p1_label, i.p2_label,
-                          epsilon=i.epsilon, sigma=i.sigma, alpha=i.alpha)
+                          epsilon=i.epsilon, sigma=i.sigma, alpha=i.alpha,
+                          r_cut=i.cutoff_radius or False)
 
 
     # PPPM
-    pppm = hoomd.md.charge.pppm(hoomd.group.charged(), nlist=nl)
-    pppm.set_params(Nx=64, Ny=64, Nz=64, order=4, rcut=6, alpha=0)
+    instr.phase("pppm")
+    if electrostatics.has_charges(sim):
+        params = electrostatics.pppm_params(sim)
+        pppm = hoomd.md.charge.pppm(hoomd.group.charged(), nlist=nl)
+        pppm.set_params(**params, alpha=0)
+        instr.record("pppm", **params)
 
 
 
     # Integrator
+    instr.phase("integrator")
     hoomd.md.integrate.mode_standard(dt=sim.dt)
-    rigid_group = hoomd.group.rigid_center()
-    sim_group = rigid_group
-    if sim.has_solvent():
-        for sol in sim.solvents:
-            solvent_group = hoomd.group.type(sol["sol"].label)
-            sim_group = hoomd.group.union(name="rigid_and_solvent",
-                                          a=sim_group, b=solvent_group)
+    sim_group = output.kept_group(sim)
     integrator = hoomd.md.integrate.langevin(group=sim_group,
                                              kT=sim.kT, seed=sim.seed)
 
 
+    # Steps of logs, checkpoints, analysis and of the frames of this
+    # segment in the trajectory index are counted across segments
+    offset = mpi.bcast(restart.start_step(sim) if mpi.is_root() else None)
+    if mpi.is_root() and sim.is_continue():
+        FrameIndex(sim.trajectory_file).start_segment(offset)
+
+
     # Logging
+    instr.phase("outputs")
     quantities = ["potential_energy", "translational_kinetic_energy",
                   "rotational_kinetic_energy"]
-    hoomd.analyze.log(filename=sim.log_file,
-                      quantities=quantities,
-                      period=sim.period,
-                      overwrite=sim.overwrite)
-    hoomd.dump.gsd(sim.trajectory_file,
-                   period=sim.period,
-                   group=hoomd.group.all(),
-                   overwrite=sim.overwrite)
+    quantities+= [q for q in sim.log_quantities if q not in quantities]
+    writer = None
+    if sim.log_format == "binary":
+        logger = hoomd.analyze.log(filename=None,
+                                   quantities=quantities,
+                                   period=sim.period)
+        writer = binlog.QueryLog(logger, quantities, sim.binlog_file,
+                                 overwrite=sim.overwrite, offset=offset)
+        hoomd.analyze.callback(callback=writer, period=sim.period)
+    else:
+        hoomd.analyze.log(filename=sim.log_file,
+                          quantities=quantities,
+                          period=sim.period,
+                          overwrite=sim.overwrite)
+    output.attach(sim)
+
+
+    hoomd.analyze.callback(callback=instr.sample, period=sim.period)
+
+    analyzers = None
+    if sim.analysis:
+        analyzers = analysis.Analysis(sim, hoomd_sys, offset=offset)
+        hoomd.analyze.callback(callback=analyzers, period=analyzers.period)
+
+    checkpoint = None
+    if sim.restart is not None:
+        checkpoint = restart.Checkpoint(sim, hoomd_sys, offset=offset)
+        hoomd.analyze.callback(callback=checkpoint,
+                               period=checkpoint.check_period)
 
 
     # Run simulation
-    hoomd.run(sim.duration)
+    instr.phase("run")
+    instr.start_run(hoomd.get_step(), int(sim.duration))
+    try:
+        hoomd.run(sim.duration)
+    except Exception:
+        if mpi.is_root(): catalog.record_finish(sim, status="failed")
+        raise
+    finally:
+        if writer is not None: writer.close()
+    if checkpoint is not None:
+        checkpoint.write(hoomd.get_step())
+    if analyzers is not None:
+        analyzers.save()
+    particles = len(hoomd_sys.particles)
+    run = instr.end_run(hoomd.get_step(), particles=particles,
+                        device=str(device))
+    instr.end_phase()
+    if mpi.is_root():
+        catalog.record_finish(sim)
+        if run is not None:
+            plan.calibrate(device, particles, run["mean_tps"], mpi.size())
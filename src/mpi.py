@@ -0,0 +1,42 @@
+import os
+
+
+# Rank and size as set by common MPI launchers, read before hoomd is
+# initialized so rank 0 can mint and write files first. Scheduler
+# variables like SLURM_NTASKS describe the allocation, not the launch,
+# and are not used.
+RANK_VARS = ("OMPI_COMM_WORLD_RANK", "PMI_RANK", "PMIX_RANK",
+             "MV2_COMM_WORLD_RANK")
+SIZE_VARS = ("OMPI_COMM_WORLD_SIZE", "PMI_SIZE", "MV2_COMM_WORLD_SIZE")
+
+
+def _from_env(names: tuple, default: int) -> int:
+    for name in names:
+        if name in os.environ:
+            return int(os.environ[name])
+    return default
+
+
+def rank() -> int:
+    return _from_env(RANK_VARS, 0)
+
+
+def size() -> int:
+    return _from_env(SIZE_VARS, 1)
+
+
+def is_root() -> bool:
+    if rank() == 0: return True
+    return False
+
+
+def is_parallel() -> bool:
+    if size() > 1: return True
+    return False
+
+
+def bcast(value: any) -> any:
+    """Value of rank 0 on every rank."""
+    if not is_parallel(): return value
+    from mpi4py import MPI
+    return MPI.COMM_WORLD.bcast(value, root=0)
@@ -0,0 +1,88 @@
+import hoomd
+from typing import List
+from .simulation import Simulation
+
+
+# Groups that can be dumped by name, constituents of rigid bodies are
+# never written as they are rebuilt from the body definitions
+GROUPS = ("centers", "solvent", "all")
+RESERVED = ("restart", "analysis", "prof", "export")
+DYNAMIC = ("attribute", "property", "momentum", "topology")
+
+
+def check(output: List[dict]) -> None:
+    """Raise for incomplete or clashing dump specs."""
+    names = set()
+    for spec in output:
+        name = spec.get("name")
+        if name is None or "period" not in spec:
+            raise Exception("Output dumps require a name and a period.")
+        if name in names or name in RESERVED or "_" in name:
+            raise Exception(f"Output name {name} is not allowed.")
+        names.add(name)
+        if "group" in spec and "types" in spec:
+            raise Exception(f"Output {name} takes either a group or types.")
+        if spec.get("group", "all") not in GROUPS:
+            raise Exception(f"Output group {spec['group']} not recognized.")
+        for d in spec.get("dynamic", []):
+            if d not in DYNAMIC:
+                raise Exception(f"Dynamic quantity {d} not recognized.")
+
+
+def solvent_group(sim: Simulation) -> "group":
+    group = None
+    for sol in sim.solvents:
+        sol_group = hoomd.group.type(sol["sol"].label)
+        if group is None:
+            group = sol_group
+        else:
+            group = hoomd.group.union(name="solvent", a=group, b=sol_group)
+    return group
+
+
+def kept_group(sim: Simulation) -> "group":
+    """Rigid centers and solvent, the particles integrated and dumped."""
+    group = hoomd.group.rigid_center()
+    solvent = solvent_group(sim)
+    if solvent is not None:
+        group = hoomd.group.union(name="rigid_and_solvent",
+                                  a=group, b=solvent)
+    return group
+
+
+def _group(sim: Simulation, spec: dict) -> "group":
+    if "types" in spec:
+        labels = [label for label in spec["types"]
+                  if sim.check_keep_particle(label)]
+        if not labels:
+            raise Exception(f"Output {spec['name']} selects no particles.")
+        group = hoomd.group.type(labels[0])
+        for label in labels[1:]:
+            group = hoomd.group.union(name=spec["name"], a=group,
+                                      b=hoomd.group.type(label))
+        return group
+    name = spec.get("group", "all")
+    if name == "centers": return hoomd.group.rigid_center()
+    if name == "solvent":
+        if not sim.has_solvent():
+            raise Exception(f"Output {spec['name']} selects no particles.")
+        return solvent_group(sim)
+    return kept_group(sim)
+
+
+def attach(sim: Simulation) -> None:
+    """Main trajectory and the extra dumps of the output section.
+
+    Only the positions and orientations are written every frame, static
+    properties are taken from the first frame by gsd readers."""
+    hoomd.dump.gsd(sim.trajectory_file,
+                   period=sim.period,
+                   group=kept_group(sim),
+                   overwrite=sim.overwrite,
+                   dynamic=["property"])
+    for spec in sim.output:
+        hoomd.dump.gsd(sim.output_file(spec["name"]),
+                       period=float(spec["period"]),
+                       group=_group(sim, spec),
+                       overwrite=sim.overwrite,
+                       dynamic=spec.get("dynamic", ["property"]))
@@ -0,0 +1,57 @@
+import os
+import pickle
+import hashlib
+from .utils import PARSE_CACHE_DIR
+
+
+# Modules whose objects are cached, entries are keyed by their
+# source so a change to the model invalidates the cache by itself
+MODEL_MODULES = ("parser.py", "simulation.py", "rigidbody.py",
+                 "interaction.py", "particle.py", "box.py", "lists.py",
+                 "device.py", "yaml_keys.py")
+
+_source_digests = {}
+
+
+def source_digest(modules: tuple=MODEL_MODULES) -> str:
+    """Hash of the source of `modules`, files of the src package."""
+    if modules not in _source_digests:
+        digest = hashlib.sha256()
+        src = os.path.dirname(os.path.abspath(__file__))
+        for name in modules:
+            with open(os.path.join(src, name), "rb") as f:
+                digest.update(f.read())
+        _source_digests[modules] = digest.hexdigest()
+    return _source_digests[modules]
+
+
+def content_key(content: bytes) -> str:
+    digest = hashlib.sha256(content)
+    digest.update(source_digest().encode())
+    return digest.hexdigest()
+
+
+def cache_file(key: str) -> str:
+    return os.path.join(PARSE_CACHE_DIR, f"{key}.pickle")
+
+
+def load(key: str) -> any:
+    """Cached object of `key`, None if missing or unreadable."""
+    try:
+        with open(cache_file(key), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError,
+            ImportError):
+        return None
+
+
+def store(key: str, obj: any) -> None:
+    """Write atomically, the cache is skipped if it is not writable."""
+    try:
+        os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+        tmp = cache_file(key) + f".{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file(key))
+    except OSError:
+        pass
@@ -8,9 +8,19 @@ from .rigidbody import RigidBody
 from .box import Box
 from .interaction import Interaction
 from .simulation import Simulation, SimData
+from .device import Device
 from . import yaml_keys as ykeys
-from .utils import BASE_DIR
+from .utils import BASE_DIR, SIMULATIONS_DIR
 from .lists import ParticleList, RigidBodyList, InteractionList
+from . import sweep
+from . import parsecache
+from . import analysis
+from . import output
+from . import plan
+
+
+# Use the C-accelerated loader of PyYAML when it is available
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
 
 
 @dataclass
@@ -22,16 +32,27 @@ class Parser:
     abs_path: str = BASE_DIR
     data: dict = None
     box: Box = None
-    particles: ParticleList = ParticleList()
-    rigidbodies: RigidBodyList = RigidBodyList()
-    interactions: InteractionList = InteractionList()
+    particles: ParticleList = field(default_factory=ParticleList)
+    rigidbodies: RigidBodyList = field(default_factory=RigidBodyList)
+    interactions: InteractionList = field(default_factory=InteractionList)
     simulation: Simulation = None
+    simulations: List[Simulation] = None
+
+    # Only clean runs are cached, continued and forked runs depend on the
+    # current state of their base trajectory
+    CACHED = ("data", "simtype", "project_name", "box", "particles",
+              "rigidbodies", "interactions", "simulation")
 
 
     def __post_init__(self):
-        self._read_file()
-        self._read_simtype()
-        self._parse_file()
+        with open(self.abs_file, "rb") as f:
+            self._content = f.read()
+        if not self._load_cached():
+            self._read_file()
+            self._read_simtype()
+            self._parse_file()
+            self._store_cached()
+        self._read_sweep()
         if "forked_from" in self.data:
             self.forked_from = self.data["forked_from"]
 
@@ -47,8 +68,21 @@ class Parser:
 
 
     def _read_file(self) -> dict:
-        with open(self.abs_file, "r") as f:
-            self.data = yaml.safe_load(f)
+        self.data = yaml.load(self._content, Loader=YamlLoader)
+
+
+    def _load_cached(self) -> bool:
+        cached = parsecache.load(parsecache.content_key(self._content))
+        if cached is None: return False
+        for attr in self.CACHED:
+            setattr(self, attr, cached[attr])
+        return True
+
+
+    def _store_cached(self) -> None:
+        if self.simtype is not ykeys.SimType.RUN: return
+        cached = {attr: getattr(self, attr) for attr in self.CACHED}
+        parsecache.store(parsecache.content_key(self._content), cached)
 
 
     @property
@@ -103,6 +137,7 @@ class Parser:
         raw = self.data[ykeys.Key.INTERACTIONS.value]
         for item in raw:
             p1_label, attrs = list(item.items())[0]
+            attrs = dict(attrs)
             with_ = attrs.pop("with")
             for other in with_:
                 i = Interaction(p1_label=p1_label, p2_label=other, **attrs)
@@ -113,17 +148,19 @@ class Parser:
     def _read_simulation(self) -> None:
         if ykeys.Key.SIMULATION.value not in self.data:
             raise Exception("Missing simulation data.")
-        raw = self.data[ykeys.Key.SIMULATION.value]
+        raw = dict(self.data[ykeys.Key.SIMULATION.value])
         rb_data = raw.pop("rigidbodies")
         solvent_data = []
         if "solvent" in raw:
             solvent_data = raw.pop("solvent")
         sim = Simulation(**raw, box=self.box, project=self.project_name)
+        output.check(sim.output)
+        if sim.limits is not None: plan.check(sim.limits)
         for item in rb_data:
             label, count = list(item.items())[0]
             rb = self.rigidbodies.get(label)
             sim.add_rigidbody(rb, int(float(count)))
-        for i in self.interactions._items:
+        for i in self.interactions:
             sim.register_interaction(i)
         for item in solvent_data:
             label, count = list(item.items())[0]
@@ -137,6 +174,13 @@ class Parser:
         self.simulation = sim
 
 
+    def _read_analysis(self) -> None:
+        if ykeys.Key.ANALYSIS.value not in self.data: return
+        raw = self.data[ykeys.Key.ANALYSIS.value] or []
+        analysis.check(raw)
+        self.simulation.analysis = raw
+
+
     def _read_project_name(self) -> None:
         self.project_name = None
         if ykeys.Key.PROJECT_NAME.value in self.data:
@@ -158,6 +202,7 @@ class Parser:
         self._read_rigidbodies()
         self._read_interactions()
         self._read_simulation()
+        self._read_analysis()
         self._read_forked_from()
 
 
@@ -178,10 +223,12 @@ class Parser:
             raise Exception("Duration is missing.")
 
         base = self._read_base_info()
-        basep = Parser(base.file, abs_path=SIMULATIONS_PATH)
+        basep = Parser(base.file, abs_path=SIMULATIONS_DIR)
         self.project_name = basep.project_name
         self.simulation = basep.simulation
         self.simulation.set_continuation_of(base, int(float(raw["duration"])))
+        if "device" in raw: self.simulation.device = Device(**raw["device"])
+        self._read_analysis()
 
 
     def _read_fork(self) -> None:
@@ -196,12 +243,30 @@ class Parser:
             raise Exception("Missing project name")
 
         base = self._read_base_info()
-        basep = Parser(base.file, abs_path=SIMULATIONS_PATH)
+        basep = Parser(base.file, abs_path=SIMULATIONS_DIR)
         self.simulation = basep.simulation
         self.simulation.project = self.project_name
         self.simulation.set_forked_from(base, int(float(raw["duration"])))
         if "kT" in raw: self.simulation.kT = raw["kT"]
         if "dt" in raw: self.simulation.dt = raw["dt"]
+        if "device" in raw: self.simulation.device = Device(**raw["device"])
+        self._read_analysis()
+
+
+    def _read_sweep(self) -> None:
+        self.simulations = [self.simulation]
+        if ykeys.Key.CHILDREN.value in self.data:
+            if self.simtype is not ykeys.SimType.FORK:
+                raise Exception("Only forks can have children.")
+            if ykeys.Key.SWEEP.value in self.data:
+                raise Exception("Forks take either children or a sweep.")
+            raw = self.data[ykeys.Key.CHILDREN.value]
+            self.simulations = sweep.children(self.simulation, raw)
+        if ykeys.Key.SWEEP.value not in self.data: return
+        if self.simtype is ykeys.SimType.CONTINUE:
+            raise Exception("Continued runs can not be swept.")
+        raw = self.data[ykeys.Key.SWEEP.value]
+        self.simulations = sweep.expand(self.simulation, raw)
 
 
     @staticmethod
@@ -224,6 +289,10 @@ class Parser:
             doc = yaml.dump(interactions, f, sort_keys=False,
                             default_flow_style=None)
             doc = yaml.dump(simulation, f, sort_keys=False)
+            if sim.analysis:
+                analyzers = {ykeys.Key.ANALYSIS.value: sim.analysis}
+                doc = yaml.dump(analyzers, f, sort_keys=False,
+                                default_flow_style=None)
             if sim.forked_from is not None:
                 forked_from = {ykeys.Key.FORKED_FROM.value:
                                sim.forked_from.as_dict()}
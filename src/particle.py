@@ -1,18 +1,27 @@
 import numpy as np
-from dataclasses import dataclass
 
 
-@dataclass
 class Particle:
 
-    label: str
-    q: int = 0
-    m: int = 1
-    diam: int = 1
-    x: float = 0
-    y: float = 0
-    z: float = 0
-    is_center: bool = False
+    __slots__ = ("label", "q", "m", "diam", "x", "y", "z", "is_center")
+
+
+    def __init__(self, label: str, q: int=0, m: int=1, diam: int=1,
+                 x: float=0, y: float=0, z: float=0, is_center: bool=False):
+        self.label = label
+        self.q = q
+        self.m = m
+        self.diam = diam
+        self.x = x
+        self.y = y
+        self.z = z
+        self.is_center = is_center
+
+
+    def __repr__(self) -> str:
+        return (f"Particle(label={self.label!r}, q={self.q}, m={self.m}, "
+                f"diam={self.diam}, x={self.x}, y={self.y}, z={self.z}, "
+                f"is_center={self.is_center})")
 
 
     def copy(self) -> "Particle":
@@ -0,0 +1,261 @@
+import os
+import re
+import json
+import math
+from typing import List
+from .simulation import Simulation
+from .device import Device
+from .interaction import max_cutoff
+from .utils import CALIBRATION_FILE
+from . import electrostatics
+from . import binlog
+
+
+# Bytes per particle of the fields written by gsd dumps, by the dynamic
+# quantity they belong to. Fields of quantities that are not dynamic are
+# written to the first frame only.
+FIELDS = {
+    "position": ("property", 12),
+    "orientation": ("property", 16),
+    "typeid": ("attribute", 4),
+    "mass": ("attribute", 4),
+    "charge": ("attribute", 4),
+    "diameter": ("attribute", 4),
+    "body": ("attribute", 4),
+    "moment_inertia": ("attribute", 12),
+    "velocity": ("momentum", 12),
+    "angmom": ("momentum", 16),
+    "image": ("momentum", 12),
+}
+
+# gsd index entry of every chunk, and the step and N chunks of a frame
+CHUNK_BYTES = 32
+FRAME_BYTES = 3 * CHUNK_BYTES + 12
+
+# Width of a value in text logs, including the delimiter
+TEXT_COLUMN_BYTES = 18
+
+# hoomd particle data in double precision, including the swap buffers
+# used to sort particles, and the host snapshot per particle
+PARTICLE_BYTES = 720
+SNAPSHOT_BYTES = 160
+# Neighbour list entries, with the default buffer of the cell list
+NLIST_BUFFER = 0.4
+NEIGHBOUR_BYTES = 4
+# Complex grids kept by PPPM
+PPPM_GRID_BYTES = 8 * 16
+
+UNITS = {"": 1, "K": 1 << 10, "M": 1 << 20, "G": 1 << 30, "T": 1 << 40}
+LIMITS = ("disk", "memory", "hours")
+
+
+def parse_size(value: any) -> int:
+    """Bytes of a size given as a number or a string like "20G" or
+    "20GiB", binary units in any case."""
+    match = re.match(r"^\s*([\d.]+)\s*([KMGT]?)(I?B)?\s*$",
+                     str(value).upper())
+    if match is None:
+        raise Exception(f"Size {value} not recognized.")
+    return int(float(match.group(1)) * UNITS[match.group(2)])
+
+
+def format_size(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024: return f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TiB"
+
+
+def check(limits: dict) -> None:
+    """Raise for unknown or malformed limits."""
+    for name, value in limits.items():
+        if name not in LIMITS:
+            raise Exception(f"Limit {name} not recognized.")
+        if name == "hours": float(value)
+        else: parse_size(value)
+
+
+def device_class(device: Device, ranks: int=1) -> str:
+    """Devices whose measured speeds are comparable."""
+    desc = device.mode
+    if device.is_cpu() and device.threads is not None:
+        desc += f":{device.threads}"
+    if ranks > 1: desc += f"x{ranks}"
+    return desc
+
+
+def calibrate(device: Device, particles: int, mean_tps: float,
+              ranks: int=1) -> None:
+    """Append the speed of a finished run to the calibration table."""
+    if not mean_tps: return
+    entry = {"device": device_class(device, ranks),
+             "particles": int(particles), "mean_tps": float(mean_tps)}
+    try:
+        with open(CALIBRATION_FILE, "a") as f:
+            f.write(json.dumps(entry) + "\n")
+    except OSError:
+        pass
+
+
+def calibration(device: str) -> List[tuple]:
+    """(particles, particle steps per second) measured on a device
+    class, sorted by the particle count."""
+    if not os.path.exists(CALIBRATION_FILE): return []
+    points = []
+    with open(CALIBRATION_FILE) as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if entry.get("device") != device: continue
+            points.append((entry["particles"],
+                           entry["particles"] * entry["mean_tps"]))
+    return sorted(points)
+
+
+def estimate_tps(device: str, particles: int) -> float:
+    """Timesteps per second interpolated from the calibration table.
+
+    The throughput in particle steps per second is interpolated in the
+    logarithm of the particle count and held constant outside of the
+    measured range. None without measurements on the device class."""
+    points = calibration(device)
+    if not points: return None
+    x = math.log(particles)
+    below = [p for p in points if math.log(p[0]) <= x]
+    above = [p for p in points if math.log(p[0]) >= x]
+    if not below: throughput = above[0][1]
+    elif not above: throughput = below[-1][1]
+    else:
+        (n0, t0), (n1, t1) = below[-1], above[0]
+        if n0 == n1:
+            throughput = (t0 + t1) / 2.
+        else:
+            w = (x - math.log(n0)) / (math.log(n1) - math.log(n0))
+            throughput = t0 + w * (t1 - t0)
+    return throughput / particles
+
+
+
+def count_particles(sim: Simulation) -> dict:
+    constituents = sum(count * (len(rb) - 1)
+                       for rb, _, count in sim.iter_rigidbodies())
+    centers = sim.count_center_particles()
+    solvent = sim.count_solvents()
+    return {"centers": centers, "constituents": constituents,
+            "solvent": solvent, "total": centers + constituents + solvent}
+
+
+def count_frames(duration: float, period: float) -> int:
+    """Frames written by a dump over a run, including its first step."""
+    return int(duration // period) + 1
+
+
+def _selected(sim: Simulation, spec: dict) -> int:
+    """Particles written by an output dump."""
+    if "types" in spec:
+        labels = set(spec["types"])
+        n = sum(count for rb, _, count in sim.iter_rigidbodies()
+                if rb.get_center().label in labels)
+        return n + sum(count for sol, _, count in sim.iter_solvents()
+                       if sol.label in labels)
+    group = spec.get("group", "all")
+    if group == "centers": return sim.count_center_particles()
+    if group == "solvent": return sim.count_solvents()
+    return sim.count_center_particles() + sim.count_solvents()
+
+
+def dump_size(particles: int, frames: int, dynamic: List[str]) -> dict:
+    """Bytes per frame of every field, and of the whole dump."""
+    fields = {name: particles * size for name, (quantity, size)
+              in FIELDS.items() if quantity in dynamic}
+    first = sum(particles * size for _, size in FIELDS.values())
+    per_frame = sum(fields.values()) + len(fields) * CHUNK_BYTES \
+                + FRAME_BYTES
+    total = first + len(FIELDS) * CHUNK_BYTES + FRAME_BYTES \
+            + (frames - 1) * per_frame
+    return {"particles": particles, "frames": frames, "fields": fields,
+            "per_frame": per_frame, "bytes": total}
+
+
+def log_size(sim: Simulation, rows: int) -> int:
+    columns = ["timestep", "potential_energy",
+               "translational_kinetic_energy", "rotational_kinetic_energy"]
+    columns+= [q for q in sim.log_quantities if q not in columns]
+    if sim.log_format == "binary":
+        return len(binlog._encode_header(columns)) \
+               + rows * len(columns) * binlog.DTYPE.itemsize
+    return (rows + 1) * len(columns) * TEXT_COLUMN_BYTES
+
+
+def memory(sim: Simulation, particles: int) -> int:
+    """Bytes held by hoomd, on the GPU for GPU runs."""
+    r_cut = max_cutoff(sim.interactions)
+    density = particles / (sim.box.Lx * sim.box.Ly * sim.box.Lz)
+    neighbours = density * 4. / 3. * math.pi * (r_cut + NLIST_BUFFER)**3
+    size = particles * (PARTICLE_BYTES + SNAPSHOT_BYTES
+                        + NEIGHBOUR_BYTES * math.ceil(neighbours))
+    if electrostatics.has_charges(sim):
+        p = electrostatics.pppm_params(sim)
+        size += p["Nx"] * p["Ny"] * p["Nz"] * PPPM_GRID_BYTES
+    return size
+
+
+def plan(sim: Simulation, device: Device=None, ranks: int=1) -> dict:
+    """Estimated size, disk use, memory and wall time of a run."""
+    particles = count_particles(sim)
+    kept = particles["centers"] + particles["solvent"]
+    frames = count_frames(sim.duration, sim.period)
+
+    dumps = {"trajectory": dump_size(kept, frames, ["property"])}
+    for spec in sim.output:
+        dumps[spec["name"]] = dump_size(
+            _selected(sim, spec),
+            count_frames(sim.duration, float(spec["period"])),
+            spec.get("dynamic", ["property"]))
+    if sim.restart is not None:
+        dumps["restart"] = dump_size(kept, 1, [])
+
+    log = log_size(sim, frames)
+    disk = sum(d["bytes"] for d in dumps.values()) + log
+
+    result = {"particles": particles, "frames": frames,
+              "steps": int(sim.duration), "dumps": dumps,
+              "log": log, "disk": disk,
+              "memory": memory(sim, particles["total"]),
+              "device": None, "tps": None, "hours": None}
+    if device is not None:
+        result["device"] = device_class(device, ranks)
+        tps = estimate_tps(result["device"], particles["total"])
+        if tps:
+            result["tps"] = tps
+            result["hours"] = sim.duration / tps / 3600.
+    return result
+
+
+def exceeded(estimate: dict, limits: dict) -> List[str]:
+    """Descriptions of the limits the estimate is over."""
+    over = []
+    if "disk" in limits and estimate["disk"] > parse_size(limits["disk"]):
+        over.append(f"disk use {format_size(estimate['disk'])} "
+                    f"exceeds {limits['disk']}")
+    if "memory" in limits and \
+            estimate["memory"] > parse_size(limits["memory"]):
+        over.append(f"memory {format_size(estimate['memory'])} "
+                    f"exceeds {limits['memory']}")
+    if "hours" in limits and estimate["hours"] is not None and \
+            estimate["hours"] > float(limits["hours"]):
+        over.append(f"wall time {estimate['hours']:.3g} h "
+                    f"exceeds {limits['hours']} h")
+    return over
+
+
+def enforce(sim: Simulation, device: Device=None, ranks: int=1) -> None:
+    """Raise if the run is estimated to exceed the limits of its
+    limits section."""
+    if not sim.limits: return
+    over = exceeded(plan(sim, device, ranks), sim.limits)
+    if over:
+        raise Exception(f"Run {sim.project} rejected: "
+                        + ", ".join(over) + ".")
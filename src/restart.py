@@ -0,0 +1,116 @@
+import os
+import time
+import gsd.hoomd
+from .simulation import Simulation
+from .trajectory import FrameIndex
+from . import mpi
+
+
+def last_trajectory_step(sim: Simulation) -> int:
+    """Step of the last frame in the trajectory, counted across segments."""
+    if not os.path.exists(sim.trajectory_file): return None
+    index = FrameIndex(sim.trajectory_file)
+    index.update()
+    if index.nframes == 0: return None
+    return index.step(-1)
+
+
+def read(sim: Simulation) -> "frame":
+    """Frame of the restart file, None when there is none."""
+    if not os.path.exists(sim.restart_file): return None
+    with gsd.hoomd.open(sim.restart_file, mode="rb") as f:
+        if len(f) == 0: return None
+        return f[0]
+
+
+def start_step(sim: Simulation) -> int:
+    """Step a run starts from, counted across segments."""
+    if not sim.is_continue(): return 0
+    steps = [last_trajectory_step(sim)]
+    frame = read(sim)
+    if frame is not None: steps.append(int(frame.configuration.step))
+    return max([s for s in steps if s is not None], default=0)
+
+
+def latest(sim: Simulation) -> "frame":
+    """Restart frame, when it is at least as recent as the trajectory."""
+    frame = read(sim)
+    if frame is None: return None
+    last = last_trajectory_step(sim)
+    if last is not None and int(frame.configuration.step) < last:
+        return None
+    return frame
+
+
+
+class Checkpoint:
+    """Writes the full state of the kept particles to the restart file.
+
+    Configured by `restart: {period, minutes}` in the simulation section,
+    a checkpoint is written every `period` steps and, when `minutes` is
+    given, also once that much wall time has passed since the last one.
+    The file holds a single frame and is replaced atomically. Its step is
+    counted across segments like the trajectory index."""
+
+    def __init__(self, sim: Simulation, system: "system", offset: int=0):
+        self.sim = sim
+        self.system = system
+        self.offset = offset
+        config = sim.restart
+        self.period = None
+        self.seconds = None
+        if config.get("period") is not None:
+            self.period = int(float(config["period"]))
+        if config.get("minutes") is not None:
+            self.seconds = 60. * float(config["minutes"])
+        if self.period is None and self.seconds is None:
+            raise Exception("Restart requires a period or minutes.")
+        self.last_write = time.monotonic()
+
+
+    @property
+    def check_period(self) -> int:
+        """Period of the hoomd callback."""
+        if self.seconds is None: return self.period
+        if self.period is None: return int(self.sim.period)
+        return min(self.period, int(self.sim.period))
+
+
+    def __call__(self, timestep: int) -> None:
+        due = self.period is not None and timestep % self.period == 0
+        if self.seconds is not None:
+            due = due or time.monotonic() - self.last_write >= self.seconds
+            # Clocks differ between ranks, they follow rank 0
+            due = mpi.bcast(due)
+        if due: self.write(timestep)
+
+
+    def write(self, timestep: int) -> None:
+        # Taking the snapshot is collective, its data is on rank 0 only
+        snap = self.system.take_snapshot(all=True)
+        self.last_write = time.monotonic()
+        if not mpi.is_root(): return
+        p = snap.particles
+        keep = self.sim.keep_mask(p.types, p.typeid)
+
+        frame = gsd.hoomd.Snapshot()
+        frame.configuration.step = self.offset + timestep
+        frame.configuration.box = [snap.box.Lx, snap.box.Ly, snap.box.Lz,
+                                   0, 0, 0]
+        frame.particles.N = int(keep.sum())
+        frame.particles.types = list(p.types)
+        frame.particles.typeid = p.typeid[keep]
+        frame.particles.position = p.position[keep]
+        frame.particles.orientation = p.orientation[keep]
+        frame.particles.velocity = p.velocity[keep]
+        frame.particles.angmom = p.angmom[keep]
+        frame.particles.image = p.image[keep]
+        frame.particles.mass = p.mass[keep]
+        frame.particles.charge = p.charge[keep]
+        frame.particles.diameter = p.diameter[keep]
+        frame.particles.moment_inertia = p.moment_inertia[keep]
+
+        tmp = self.sim.restart_file + ".tmp"
+        with gsd.hoomd.open(tmp, mode="wb") as f:
+            f.append(frame)
+        os.replace(tmp, self.sim.restart_file)
@@ -1,52 +1,120 @@
 import numpy as np
-from typing import List
+from typing import List, Callable
 from dataclasses import dataclass, field
 from .particle import Particle
 
 
-class Iterator:
+def principal_axes(I: np.array) -> tuple:
+    """Principal moments and axes (as columns) of an inertia tensor.
 
-    def __init__(self, particles: list):
-        self._particles = particles
-        self._index = 0
+    The axes are ordered and signed to stay as close as possible to the
+    original x, y, z axes, so bodies already given in their principal
+    frame are left untouched."""
+    moments, axes = np.linalg.eigh(I)
+    dominant = np.argmax(np.abs(axes), axis=0)
+    if len(set(dominant)) == 3:
+        order = np.argsort(dominant)
+        moments, axes = moments[order], axes[:, order]
+    signs = np.sign(np.diag(axes))
+    signs[signs == 0] = 1
+    axes = axes * signs
+    if np.linalg.det(axes) < 0:
+        axes[:, 2] *= -1
+    return moments, axes
 
 
-    def __next__(self):
-        if self._index < len(self._particles):
-            self._index += 1
-            return self._particles[self._index-1]
-        self._index = 0
-        raise StopIteration
 
-
-
-
-@dataclass
+@dataclass(eq=False)
 class RigidBody:
+    """Rigid body stored as arrays of its constituent particles.
+
+    Particles are kept per type in `types`, the positions, type ids and
+    center flags per constituent. Mass properties are computed with
+    NumPy and cached until the next particle is added."""
 
     label: str
-    _particles: List[Particle] = field(default_factory=lambda: [])
     fixed_pos_x: float = None
     fixed_pos_y: float = None
     fixed_pos_z: float = None
+    types: List[Particle] = field(default_factory=lambda: [])
+    _typeid: List[int] = field(default_factory=lambda: [], repr=False)
+    _positions: List[np.array] = field(default_factory=lambda: [],
+                                       repr=False)
+    _is_center: List[bool] = field(default_factory=lambda: [], repr=False)
+    _cache: dict = field(default_factory=dict, init=False, repr=False)
+
+
+    def __len__(self) -> int:
+        return len(self._typeid)
 
 
     def __getitem__(self, index) -> Particle:
-        if index >= len(self._particles):
+        if index >= len(self):
             raise IndexError
-        return self._particles[index]
+        p = self.types[self._typeid[index]].copy()
+        p.position = self._positions[index]
+        p.is_center = self._is_center[index]
+        return p
 
 
     def __iter__(self):
-        return Iterator(self._particles)
+        return (self[i] for i in range(len(self)))
 
 
     def add_particle(self, p: Particle, pos: np.array,
                      is_center: bool=False) -> None:
-        toadd = p.copy()
-        toadd.position = pos
-        toadd.is_center = is_center
-        self._particles.append(toadd)
+        labels = [t.label for t in self.types]
+        if p.label not in labels:
+            self.types.append(p.copy())
+            labels.append(p.label)
+        self._typeid.append(labels.index(p.label))
+        self._positions.append(np.asarray(pos, dtype=float))
+        self._is_center.append(bool(is_center))
+        self._cache.clear()
+
+
+    def _array(self, name: str, build: Callable) -> np.array:
+        if name not in self._cache:
+            self._cache[name] = build()
+        return self._cache[name]
+
+
+    @property
+    def typeids(self) -> np.array:
+        return self._array("typeids",
+            lambda: np.asarray(self._typeid, dtype=int))
+
+
+    @property
+    def positions(self) -> np.array:
+        return self._array("positions",
+            lambda: np.asarray(self._positions, dtype=float).reshape(-1, 3))
+
+
+    @property
+    def is_center(self) -> np.array:
+        return self._array("is_center",
+            lambda: np.asarray(self._is_center, dtype=bool))
+
+
+    def _per_particle(self, attr: str) -> np.array:
+        values = np.array([getattr(t, attr) for t in self.types], dtype=float)
+        return values[self.typeids]
+
+
+    @property
+    def masses(self) -> np.array:
+        return self._array("masses", lambda: self._per_particle("m"))
+
+
+    @property
+    def charges(self) -> np.array:
+        return self._array("charges", lambda: self._per_particle("q"))
+
+
+    @property
+    def diameters(self) -> np.array:
+        return self._array("diameters", lambda: self._per_particle("diam"))
 
 
     @property
@@ -73,27 +141,18 @@ class RigidBody:
 
 
     def list_unique_particles(self) -> List[Particle]:
-        unique = []
-        for p in self:
-
-            is_reg = False
-
-            if len(unique) > 0:
-                for up in unique:
-                    if p == up:
-                        is_reg = True
-                        break
+        return list(self.types)
 
-            if not is_reg:
-                unique.append(p)
 
-        return unique
+    def _center_index(self) -> int:
+        centers = np.flatnonzero(self.is_center)
+        if len(centers) == 0:
+            raise Exception("No center particle found.")
+        return int(centers[0])
 
 
     def get_center(self) -> Particle:
-        for p in self:
-            if p.is_center: return p
-        raise Exception("No center particle found.")
+        return self[self._center_index()]
 
 
     def get_non_center(self) -> List[Particle]:
@@ -106,21 +165,56 @@ class RigidBody:
 
     @property
     def mass(self) -> float:
-        return sum([p.m for p in self])
+        return self._array("mass", lambda: float(self.masses.sum()))
 
 
     @property
     def center_of_mass(self) -> np.array:
-        wpos = [p.m*p.position for p in self]
-        return np.sum(np.asarray(wpos), axis=0) / self.mass
+        return self._array("center_of_mass",
+            lambda: self.masses @ self.positions / self.mass)
+
+
+    @property
+    def origin(self) -> np.array:
+        """Position of the center particle, the body origin in hoomd."""
+        return self._array("origin",
+            lambda: self.positions[self._center_index()])
+
+
+    @property
+    def inertia_tensor(self) -> np.array:
+        """Inertia tensor about the center particle, which hoomd rotates
+        the body about, with the center particle taken as a solid
+        sphere."""
+        def build():
+            r = self.positions - self.origin
+            r2 = np.einsum("ij,ij->i", r, r)
+            I = np.eye(3) * np.sum(self.masses * r2) \
+                - np.einsum("i,ij,ik->jk", self.masses, r, r)
+            c = self._center_index()
+            I += np.eye(3) * 0.4 * (self.diameters[c] / 2.)**2 \
+                 * self.masses[c]
+            return I
+        return self._array("inertia_tensor", build)
+
+
+    @property
+    def principal_frame(self) -> tuple:
+        return self._array("principal_frame",
+            lambda: principal_axes(self.inertia_tensor))
 
 
     @property
     def moment_of_inertia(self) -> np.array:
-        I = np.zeros(3)
-        pc = self.get_center()
-        I+= 0.4 * pc.r**2 * pc.m
-        for p in self:
-            if p.is_center: continue
-            I += p.m * (self.center_of_mass - p.position)**2
-        return I
+        """Principal moments of inertia."""
+        return self.principal_frame[0]
+
+
+    @property
+    def body_positions(self) -> np.array:
+        """Positions relative to the center particle in the principal
+        frame, the frame of the body orientation in hoomd."""
+        def build():
+            axes = self.principal_frame[1]
+            return (self.positions - self.origin) @ axes
+        return self._array("body_positions", build)
@@ -0,0 +1,50 @@
+import traceback
+import multiprocessing as mp
+from typing import List
+from .simulation import Simulation
+from .device import Device
+from .sharedframe import SharedFrame
+from . import md
+
+
+_device = None
+_frame = None
+
+
+def _init_worker(devices: "Queue", frame: tuple) -> None:
+    global _device, _frame
+    _device = devices.get()
+    if frame is not None:
+        _frame = SharedFrame.attach(frame)
+
+
+def _run(sim: Simulation) -> tuple:
+    try:
+        md.mdrun(sim, _device, frame=_frame)
+    except Exception:
+        return sim.project, traceback.format_exc()
+    return sim.project, None
+
+
+def run_sweep(sims: List[Simulation], devices: List[Device],
+              frame: tuple=None) -> dict:
+    """Run the simulations on a pool with one worker process per device.
+
+    Forked runs start from the shared frame of the `frame` handle when it
+    is given. Returns the error traceback of every failed run by project
+    name."""
+    ctx = mp.get_context("spawn")
+    queue = ctx.Queue()
+    for device in devices:
+        queue.put(device)
+
+    failed = {}
+    with ctx.Pool(processes=min(len(devices), len(sims)),
+                  initializer=_init_worker, initargs=(queue, frame)) as pool:
+        for project, error in pool.imap_unordered(_run, sims):
+            if error is None:
+                print(f"Finished sweep member: {project}")
+                continue
+            print(f"Sweep member {project} failed:\n{error}")
+            failed[project] = error
+    return failed
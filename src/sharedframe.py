@@ -0,0 +1,82 @@
+import types
+import numpy as np
+from multiprocessing import shared_memory
+from .simulation import Simulation
+from .snapshot import FRAME_FIELDS, read_frame, frame_arrays
+
+
+# Arrays start at multiples of this many bytes in the shared block
+ALIGN = 64
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """Attach to a block without tracking it, the creating process
+    unlinks it. Before Python 3.13 it is registered with the resource
+    tracker that worker processes share with their parent."""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        return shared_memory.SharedMemory(name=name)
+
+
+
+class SharedFrame:
+    """Particle arrays of one frame in a shared memory block.
+
+    The frame is decoded once by the creating process, worker processes
+    attach to the block by its handle and read the arrays in place. It
+    provides the `particles` attributes of a gsd frame, so it can be
+    passed to create_snapshot."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, layout: dict,
+                 particle_types: list, owner: bool=False):
+        self.shm = shm
+        self.layout = layout
+        self.owner = owner
+        self.particles = types.SimpleNamespace(types=particle_types)
+        for name, (offset, shape, dtype) in layout.items():
+            setattr(self.particles, name,
+                    np.ndarray(shape, dtype=dtype, buffer=shm.buf,
+                               offset=offset))
+
+
+    @staticmethod
+    def create(particle_types: list, arrays: dict) -> "SharedFrame":
+        layout, size = {}, 0
+        for name in FRAME_FIELDS:
+            array = np.ascontiguousarray(arrays[name])
+            layout[name] = (size, array.shape, array.dtype.str)
+            size += -(-array.nbytes // ALIGN) * ALIGN
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        frame = SharedFrame(shm, layout, list(particle_types), owner=True)
+        for name in FRAME_FIELDS:
+            getattr(frame.particles, name)[...] = arrays[name]
+        return frame
+
+
+    @staticmethod
+    def from_simulation(sim: Simulation) -> "SharedFrame":
+        """Decode the frame a continued or forked run starts from."""
+        frame, _ = read_frame(sim)
+        return SharedFrame.create(frame.particles.types,
+                                  frame_arrays(sim, frame))
+
+
+    @property
+    def handle(self) -> tuple:
+        """Picklable reference passed to worker processes."""
+        return self.shm.name, self.layout, list(self.particles.types)
+
+
+    @staticmethod
+    def attach(handle: tuple) -> "SharedFrame":
+        name, layout, particle_types = handle
+        return SharedFrame(_attach(name), layout, particle_types)
+
+
+    def close(self) -> None:
+        """Drop the views and release the block, the owner unlinks it."""
+        for name in self.layout:
+            setattr(self.particles, name, None)
+        self.shm.close()
+        if self.owner: self.shm.unlink()
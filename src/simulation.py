@@ -1,13 +1,16 @@
 import os
 import datetime
-from typing import List
+import numpy as np
+from typing import List, Callable, Iterator
 from dataclasses import dataclass, field
 from .rigidbody import RigidBody
 from .particle import Particle
 from .interaction import Interaction
 from .box import Box
+from .device import Device
 from .yaml_keys import SimType
 from .utils import SIMULATIONS_DIR
+from .trajectory import FrameIndex
 
 
 @dataclass
@@ -15,10 +18,13 @@ class SimData:
 
     file: str
     frame: int = -1
+    step: int = None
 
 
     def as_dict(self) -> dict:
-        return {"file": self.file, "frame": self.frame}
+        data = {"file": self.file, "frame": self.frame}
+        if self.step is not None: data["step"] = self.step
+        return data
 
 
 
@@ -39,6 +45,16 @@ class Simulation:
     timestamp: str = None
     start_from: int = 0
     simtype: SimType = None
+    device: Device = None
+    pppm: dict = None
+    restart: dict = None
+    analysis: List[dict] = field(default_factory=lambda: [])
+    output: List[dict] = field(default_factory=lambda: [])
+    log: dict = None
+    placement: dict = None
+    limits: dict = None
+    _views: dict = field(default_factory=dict, init=False, repr=False,
+                         compare=False)
 
     continuation_of: SimData = None
     forked_from: SimData = None
@@ -49,6 +65,10 @@ class Simulation:
     def __post_init__(self):
         self.period = float(self.period)
         self.duration = float(self.duration)
+        if isinstance(self.device, dict):
+            self.device = Device(**self.device)
+        if self.log_format not in ("text", "binary"):
+            raise Exception(f"Log format {self.log_format} not recognized.")
 
 
     def __eq__(self, other: RigidBody):
@@ -56,87 +76,110 @@ class Simulation:
         return True
 
 
-    def set_frame(self, frame_index: int) -> None:
-        if frame_index == -1:
-            frame_index = (self.duration / self.period) - 1
-        if frame_index > self.duration / self.period:
-            raise Exception("Frame is out of bounds.")
-        self.start_from = int(frame_index)
+    def set_frame(self, trajectory_file: str, frame_index: int=-1,
+                  step: int=None) -> int:
+        index = FrameIndex(trajectory_file)
+        self.start_from = index.resolve(frame_index, step)
+        return index.step(self.start_from)
 
 
     def set_continuation_of(self, simd: SimData, dur: int) -> None:
         self.continuation_of = simd
-        self.set_frame(-1)
         self.project_filename = simd.file
+        self.set_frame(self.trajectory_file)
         self.previous_duration = self.duration
         self.duration = dur
 
 
     def set_forked_from(self, simd: SimData, dur: int) -> None:
         self.forked_from = simd
-        self.set_frame(simd.frame)
         self.base_trajectory = os.path.join(self.path,
                                 self.forked_from.file.replace(".yaml", ".gsd"))
+        step = self.set_frame(self.base_trajectory, simd.frame, simd.step)
         self.duration = dur
         self.forked_from.frame = self.start_from
+        self.forked_from.step = step
+
+
+    def invalidate(self) -> None:
+        """Drop the cached views, call after changing the composition."""
+        self._views.clear()
+
+
+    def _view(self, name: str, build: Callable) -> any:
+        if name not in self._views:
+            self._views[name] = build()
+        return self._views[name]
 
 
     def add_rigidbody(self, rb: RigidBody, count: int) -> None:
         self.rigidbodies.append({"rb": rb, "count": count})
+        self.invalidate()
 
 
     def add_solvent(self, sol: Particle, count: int) -> None:
         self.solvents.append({"sol": sol, "count": count})
+        self.invalidate()
 
 
     def register_interaction(self, i: Interaction) -> None:
         self.interactions.append(i)
+        self.invalidate()
 
 
     def list_unique_particles(self) -> List[Particle]:
-        unique = []
-        for rbdict in self.rigidbodies:
-            for p in rbdict["rb"]:
-                is_reg = False
-                if len(unique) > 0:
-                    for up in unique:
-                        if p == up:
-                            is_reg = True
-                            break
-                if not is_reg:
-                    unique.append(p)
-
-        for sol in self.solvents:
-            unique.append(sol["sol"])
-
-        return unique
+        def build():
+            unique = {}
+            for rbdict in self.rigidbodies:
+                for p in rbdict["rb"].list_unique_particles():
+                    unique.setdefault(p.label, p)
+            for sol in self.solvents:
+                unique.setdefault(sol["sol"].label, sol["sol"])
+            return list(unique.values())
+        return self._view("unique_particles", build)
 
 
     @property
     def types_list(self) -> List[str]:
-        return [p.label for p in self.list_unique_particles()]
+        return self._view("types_list",
+            lambda: [p.label for p in self.list_unique_particles()])
+
+
+    def type_id(self, label: str) -> int:
+        type_ids = self._view("type_ids",
+            lambda: {t: i for i, t in enumerate(self.types_list)})
+        return type_ids[label]
 
 
     @property
     def N(self) -> int:
-        return self.count_center_particles() + self.count_solvents()
+        return self._view("N",
+            lambda: self.count_center_particles() + self.count_solvents())
 
 
     def list_unique_rigidbodies(self) -> List[RigidBody]:
-        unique = []
-        for rbdict in self.rigidbodies:
-            rb = rbdict["rb"]
-            is_reg = False
+        def build():
+            unique = {}
+            for rbdict in self.rigidbodies:
+                unique.setdefault(rbdict["rb"].label, rbdict["rb"])
+            return list(unique.values())
+        return self._view("unique_rigidbodies", build)
 
-            if len(unique) > 0:
-                for urb in unique:
-                    if rb == urb:
-                        is_reg = True
-                        break
 
-            if not is_reg:
-                unique.append(rb)
-        return unique
+    def iter_rigidbodies(self) -> Iterator[tuple]:
+        """Yield (rigid body, index of first center, count) ranges."""
+        start = 0
+        for rbd in self.rigidbodies:
+            yield rbd["rb"], start, rbd["count"]
+            start += rbd["count"]
+
+
+    def iter_solvents(self) -> Iterator[tuple]:
+        """Yield (solvent, index of first particle, count) ranges."""
+        start = self.count_center_particles()
+        for sold in self.solvents:
+            yield sold["sol"], start, sold["count"]
+            start += sold["count"]
 
 
     def count_center_particles(self) -> int:
@@ -147,20 +190,6 @@ class Simulation:
         return sum([sol["count"] for sol in self.solvents])
 
 
-    def list_center_particles(self) -> List[Particle]:
-        cps = []
-        for rbd in self.rigidbodies:
-            cps+= [rbd["rb"].get_center()]*rbd["count"]
-        return cps
-
-
-    def unique_center_particles(self) -> List[Particle]:
-        cps = []
-        for rbd in self.rigidbodies:
-            cps+= [rbd["rb"].get_center()]
-        return cps
-
-
     def as_dict(self) -> dict:
         data = {
             "rigidbodies":
@@ -174,6 +203,20 @@ class Simulation:
         if self.has_solvent():
             data["solvent"] = \
                     [{sol["sol"].label: sol["count"]} for sol in self.solvents]
+        if self.device is not None:
+            data["device"] = self.device.as_dict()
+        if self.pppm is not None:
+            data["pppm"] = self.pppm
+        if self.restart is not None:
+            data["restart"] = self.restart
+        if self.output:
+            data["output"] = self.output
+        if self.log is not None:
+            data["log"] = self.log
+        if self.placement is not None:
+            data["placement"] = self.placement
+        if self.limits is not None:
+            data["limits"] = self.limits
         return data
 
 
@@ -184,21 +227,6 @@ class Simulation:
         raise Exception(f"Particle with label {label} was not found.")
 
 
-    def list_rigidbodies(self) -> List[RigidBody]:
-        rbs = []
-        for rbd in self.rigidbodies:
-            rbs+= [rbd["rb"]]*rbd["count"]
-        return rbs
-
-
-    def list_solvents(self) -> List[Particle]:
-        if not self.has_solvent(): return []
-        solvs = []
-        for sold in self.solvents:
-            solvs+= [sold["sol"]]*sold["count"]
-        return solvs
-
-
     def mint(self) -> None:
         self.timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
 
@@ -239,6 +267,67 @@ class Simulation:
         return os.path.join(self.path, self.log_filename)
 
 
+    @property
+    def log_format(self) -> str:
+        if self.log is None: return "text"
+        return self.log.get("format", "text")
+
+
+    @property
+    def log_quantities(self) -> List[str]:
+        """Quantities logged in addition to the energies."""
+        if self.log is None: return []
+        return list(self.log.get("quantities", []))
+
+
+    @property
+    def binlog_filename(self) -> str:
+        if self.timestamp is None:
+            raise Exception("Project not minted")
+        return f"{self.project}_{self.timestamp}.binlog"
+
+
+    @property
+    def binlog_file(self) -> str:
+        return os.path.join(self.path, self.binlog_filename)
+
+
+    @property
+    def profile_filename(self) -> str:
+        if self.timestamp is None:
+            raise Exception("Project not minted")
+        return f"{self.project}_{self.timestamp}.prof.jsonl"
+
+
+    @property
+    def profile_file(self) -> str:
+        return os.path.join(self.path, self.profile_filename)
+
+
+    @property
+    def restart_filename(self) -> str:
+        if self.timestamp is None:
+            raise Exception("Project not minted")
+        return f"{self.project}_{self.timestamp}.restart.gsd"
+
+
+    @property
+    def restart_file(self) -> str:
+        return os.path.join(self.path, self.restart_filename)
+
+
+    @property
+    def analysis_filename(self) -> str:
+        if self.timestamp is None:
+            raise Exception("Project not minted")
+        return f"{self.project}_{self.timestamp}.analysis.npz"
+
+
+    @property
+    def analysis_file(self) -> str:
+        return os.path.join(self.path, self.analysis_filename)
+
+
     @property
     def trajectory_filename(self) -> str:
         if self.timestamp is None:
@@ -251,6 +340,16 @@ class Simulation:
         return os.path.join(self.path, self.trajectory_filename)
 
 
+    def output_filename(self, name: str) -> str:
+        if self.timestamp is None:
+            raise Exception("Project not minted")
+        return f"{self.project}_{self.timestamp}.{name}.gsd"
+
+
+    def output_file(self, name: str) -> str:
+        return os.path.join(self.path, self.output_filename(name))
+
+
     def set_fork_data(self, fd: dict) -> None:
         self.forked_from = fd
 
@@ -286,13 +385,23 @@ class Simulation:
 
     @property
     def keep_particles(self) -> List[str]:
-        labels = [rb["rb"].get_center().label for rb in self.rigidbodies]
-        labels+= [sol["sol"].label for sol in self.solvents]
-        return labels
+        def build():
+            labels = [rb["rb"].get_center().label for rb in self.rigidbodies]
+            labels+= [sol["sol"].label for sol in self.solvents]
+            return labels
+        return self._view("keep_particles", build)
+
+
+    def keep_mask(self, types: List[str], typeid: np.array) -> np.array:
+        """Boolean mask of the particles kept between runs."""
+        keep = self._view("keep_set", lambda: set(self.keep_particles))
+        keep_ids = [i for i, label in enumerate(types) if label in keep]
+        return np.isin(typeid, keep_ids)
 
 
     def check_keep_particle(self, label: str) -> bool:
-        if label in self.keep_particles: return True
+        keep = self._view("keep_set", lambda: set(self.keep_particles))
+        if label in keep: return True
         return False
 
 
@@ -1,7 +1,98 @@
+import numpy as np
 import hoomd
 import gsd.hoomd
 from .simulation import Simulation
 from . import utils
+from . import restart
+from . import snapshotcache
+
+
+# Minimum distances of randomly placed rigid centers and solvent, and the
+# cell size of the grid finding their neighbours
+RIGID_DMIN = 5.
+SOLVENT_DMIN = 4.
+GRID_CELL = 5.
+# Minimum distance of the lattice placement when its section has none
+LATTICE_DMIN = 4.
+PLACEMENT_PARAMETERS = {"rigid_dmin": RIGID_DMIN,
+                        "solvent_dmin": SOLVENT_DMIN,
+                        "grid_cell": GRID_CELL,
+                        "lattice_dmin": LATTICE_DMIN}
+
+
+def _particle_arrays(sim: Simulation) -> dict:
+    """Per-particle arrays of the rigid centers followed by the solvent.
+
+    Properties are computed once per rigid body or solvent type and
+    expanded with their counts."""
+    particles = [rbd["rb"].get_center() for rbd in sim.rigidbodies]
+    particles+= [sold["sol"] for sold in sim.solvents]
+    inertia = [rbd["rb"].moment_of_inertia for rbd in sim.rigidbodies]
+    inertia+= [np.ones(3) for _ in sim.solvents]
+    counts = [rbd["count"] for rbd in sim.rigidbodies]
+    counts+= [sold["count"] for sold in sim.solvents]
+
+    def expand(values: list, dtype: type) -> np.array:
+        return np.repeat(np.asarray(values, dtype=dtype), counts, axis=0)
+
+    return {
+        "typeid": expand([sim.type_id(p.label) for p in particles], int),
+        "charge": expand([p.q for p in particles], float),
+        "diameter": expand([p.diam for p in particles], float),
+        "moment_inertia": expand(inertia, float).reshape(-1, 3),
+    }
+
+
+
+def lattice_positions(sim: Simulation,
+                      rng: np.random.Generator) -> np.array:
+    """Positions of the rigid centers and solvent on the lattice of the
+    placement section, `placement: {lattice, jitter, random_species,
+    dmin}`.
+
+    Fixed rigid bodies keep their positions and the sites next to them
+    are left out. The other particles take a random subset of the sites,
+    in order of species unless random_species is set."""
+    config = sim.placement
+    positions = np.zeros((sim.N, 3))
+    fixed = np.zeros(sim.N, dtype=bool)
+    for rb, start, count in sim.iter_rigidbodies():
+        if rb.is_fixed():
+            positions[start:start+count] = rb.fixed_position
+            fixed[start:start+count] = True
+
+    free = int((~fixed).sum())
+    sites = utils.lattice_sites(sim.box, free,
+                                lattice=config.get("lattice", "sc"),
+                                exclude=positions[fixed],
+                                dmin=float(config.get("dmin", LATTICE_DMIN)),
+                                jitter=float(config.get("jitter", 0.)),
+                                rng=rng)
+    chosen = np.sort(rng.choice(len(sites), free, replace=False))
+    if config.get("random_species", False):
+        rng.shuffle(chosen)
+    positions[~fixed] = sites[chosen]
+    return positions
+
+
+
+def place_particles(sim: Simulation, snapshot: "snapshot",
+                    rng: np.random.Generator) -> None:
+    if sim.placement is not None:
+        snapshot.particles.position[:] = lattice_positions(sim, rng)
+        return
+
+    grid = utils.SpatialHash(sim.box, cell_size=GRID_CELL)
+    for rb, start, count in sim.iter_rigidbodies():
+        for i in range(start, start + count):
+            utils.place_particle(snapshot, i, dmin=RIGID_DMIN, grid=grid,
+                                 fixed_position=rb.fixed_position, rng=rng)
+
+    for _, start, count in sim.iter_solvents():
+        for i in range(start, start + count):
+            utils.place_particle(snapshot, i, dmin=SOLVENT_DMIN, grid=grid,
+                                 rng=rng)
+
 
 
 def fresh_snapshot(sim: Simulation) -> "snapshot":
@@ -9,32 +100,48 @@ def fresh_snapshot(sim: Simulation) -> "snapshot":
     snapshot = hoomd.data.make_snapshot(N=sim.N, box=box)
     snapshot.particles.types = sim.types_list
 
-    # --- Add particles:
-    for i, rb in enumerate(sim.list_rigidbodies()):
-        p = rb.get_center()
-        snapshot.particles.typeid[i] = sim.types_list.index(p.label)
-        snapshot.particles.charge[i] = p.q
-        snapshot.particles.orientation[i] = utils.random_quaternion()
-        snapshot.particles.diameter[i] = p.diam
-        snapshot.particles.moment_inertia[i] = rb.moment_of_inertia
-        utils.place_particle(snapshot, i,
-                             fixed_position=rb.fixed_position, dmin=5.)
-
-
-    # --- Add solvent:
-    for j, sol in enumerate(sim.list_solvents()):
-        indx = i + j + 1
-        snapshot.particles.typeid[indx] = sim.types_list.index(sol.label)
-        snapshot.particles.charge[i] = sol.q
-        snapshot.particles.orientation[i] = utils.random_quaternion()
-        snapshot.particles.diameter[i] = sol.diam
-        snapshot.particles.moment_inertia[i] = [1, 1, 1]
-        utils.place_particle(snapshot, indx, dmin=4.)
-
+    arrays = _particle_arrays(sim)
+    snapshot.particles.typeid[:] = arrays["typeid"]
+    snapshot.particles.charge[:] = arrays["charge"]
+    snapshot.particles.diameter[:] = arrays["diameter"]
+    snapshot.particles.moment_inertia[:] = arrays["moment_inertia"]
+
+    # --- Place particles, or reuse an earlier placement of the same seed.
+    # The placement draws from its own generator, so the global one is in
+    # the same state whether the cache is hit or not.
+    key = snapshotcache.placement_key(sim, PLACEMENT_PARAMETERS)
+    cached = snapshotcache.load(key)
+    if cached is not None:
+        snapshot.particles.position[:] = cached["position"]
+        snapshot.particles.orientation[:] = cached["orientation"]
+        return snapshot
+
+    rng = np.random.default_rng(sim.seed)
+    place_particles(sim, snapshot, rng)
+    snapshot.particles.orientation[:] = utils.random_quaternions(sim.N, rng)
+    snapshotcache.store(key, position=snapshot.particles.position,
+                        orientation=snapshot.particles.orientation)
     return snapshot
 
 
-def continue_snapshot(sim: Simulation) -> "snapshot":
+
+# Per-particle fields carried over from a frame
+FRAME_FIELDS = ("typeid", "position", "charge", "diameter", "orientation",
+                "moment_inertia")
+# Written to every frame of the restart file only, the trajectory holds
+# them in its first frame. Runs starting from a trajectory frame start
+# at rest with zero image flags.
+MOMENTUM_FIELDS = ("velocity", "angmom", "image")
+
+
+def read_frame(sim: Simulation) -> tuple:
+    """Frame a continued or forked run starts from, and the fields that
+    are carried over from it."""
+
+    # Continued runs start from the restart file when it is recent
+    if sim.is_continue():
+        frame = restart.latest(sim)
+        if frame is not None: return frame, FRAME_FIELDS + MOMENTUM_FIELDS
 
     trajectory_file = None
     if sim.is_fork():
@@ -46,40 +153,54 @@ def continue_snapshot(sim: Simulation) -> "snapshot":
         raise Exception("Trajectory file was not specified.")
 
     trajectory = gsd.hoomd.open(trajectory_file)
-    struct0 = trajectory.read_frame(sim.start_from)
+    return trajectory[sim.start_from], FRAME_FIELDS
+
 
 
-    Lx, Ly, Lz, *_ = struct0.configuration.box
-    center_particles = sim.unique_center_particles()
+def frame_arrays(sim: Simulation, frame: "frame",
+                 fields: tuple=FRAME_FIELDS) -> dict:
+    """Arrays of the particles of a frame kept between runs."""
+    keep = sim.keep_mask(frame.particles.types, frame.particles.typeid)
+    if keep.sum() != sim.N:
+        raise Exception("Particle count of frame does not match simulation.")
+    return {name: getattr(frame.particles, name)[keep] for name in fields}
+
+
+
+def continue_snapshot(sim: Simulation, frame: "frame"=None) -> "snapshot":
+
+    # Frames passed in are shared trajectory frames of forks
+    fields = FRAME_FIELDS
+    if frame is None:
+        frame, fields = read_frame(sim)
 
     box = hoomd.data.boxdim(Lx=sim.box.Lx, Ly=sim.box.Ly, Lz=sim.box.Lz)
     snapshot = hoomd.data.make_snapshot(N=sim.N, box=box)
 
-    snapshot.particles.types = struct0.particles.types
-
-    i = 0
-    for i0 in range(struct0.particles.N):
-        label = struct0.particles.types[struct0.particles.typeid[i0]]
-        if not sim.check_keep_particle(label): continue
-        snapshot.particles.typeid[i] = struct0.particles.typeid[i0]
-        snapshot.particles.position[i] = struct0.particles.position[i0]
-        snapshot.particles.charge[i] = struct0.particles.charge[i0]
-        snapshot.particles.diameter[i] = struct0.particles.diameter[i0]
-        snapshot.particles.orientation[i] = struct0.particles.orientation[i0]
-        snapshot.particles.moment_inertia[i] = \
-            struct0.particles.moment_inertia[i0]
-        i += 1
+    snapshot.particles.types = list(frame.particles.types)
+    arrays = frame_arrays(sim, frame, fields)
+    for name in fields:
+        getattr(snapshot.particles, name)[:] = arrays[name]
 
     return snapshot
 
 
 
-def create_snapshot(sim: Simulation) -> "snapshot":
+def empty_snapshot(sim: Simulation) -> "snapshot":
+    """Placeholder of the ranks other than 0 in MPI runs."""
+    box = hoomd.data.boxdim(Lx=sim.box.Lx, Ly=sim.box.Ly, Lz=sim.box.Lz)
+    return hoomd.data.make_snapshot(N=0, box=box)
+
+
+
+def create_snapshot(sim: Simulation, frame: "frame"=None) -> "snapshot":
+    """Starting snapshot, continued and forked runs start from `frame`
+    when it is given instead of reading it."""
 
     if sim.is_run():
         return fresh_snapshot(sim)
     if sim.is_continue():
-        return continue_snapshot(sim)
+        return continue_snapshot(sim, frame)
     if sim.is_fork():
-        return continue_snapshot(sim)
+        return continue_snapshot(sim, frame)
     raise Exception("Error encountered selecting sim type.")
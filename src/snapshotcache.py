@@ -0,0 +1,77 @@
+import os
+import json
+import hashlib
+import numpy as np
+from .simulation import Simulation
+from .utils import SNAPSHOT_CACHE_DIR
+from .parsecache import source_digest
+
+
+# Modules that place the particles, entries are keyed by their source so
+# a change to the placement invalidates the cache by itself
+PLACEMENT_MODULES = ("snapshot.py", "snapshotcache.py", "utils.py")
+
+# Entries are evicted, least recently used first, above this size
+MAX_BYTES = 1 << 30
+
+
+def placement_key(sim: Simulation, parameters: dict) -> str:
+    """Hash of everything the initial positions and orientations depend
+    on: box, composition, placement section and seed, the fixed
+    `parameters` of the placement and the source of its code."""
+    composition = [["rb", rb.label, count,
+                    None if not rb.is_fixed() else rb.fixed_position.tolist()]
+                   for rb, _, count in sim.iter_rigidbodies()]
+    composition+= [["sol", sol.label, count]
+                   for sol, _, count in sim.iter_solvents()]
+    data = {"source": source_digest(PLACEMENT_MODULES),
+            "parameters": parameters, "box": sim.box.as_dict(),
+            "composition": composition, "placement": sim.placement,
+            "seed": sim.seed}
+    return hashlib.sha256(json.dumps(data, sort_keys=True).encode()) \
+                  .hexdigest()
+
+
+def cache_file(key: str) -> str:
+    return os.path.join(SNAPSHOT_CACHE_DIR, f"{key}.npz")
+
+
+def load(key: str) -> dict:
+    """Cached arrays of `key`, None if missing or unreadable."""
+    file = cache_file(key)
+    try:
+        with np.load(file) as data:
+            arrays = {name: data[name] for name in data.files}
+        os.utime(file)
+    except (OSError, ValueError, KeyError):
+        return None
+    return arrays
+
+
+def evict(max_bytes: int=MAX_BYTES) -> None:
+    """Remove the least recently used entries above `max_bytes`."""
+    entries = []
+    for name in os.listdir(SNAPSHOT_CACHE_DIR):
+        if not name.endswith(".npz"): continue
+        stat = os.stat(os.path.join(SNAPSHOT_CACHE_DIR, name))
+        entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes: break
+        try:
+            os.remove(os.path.join(SNAPSHOT_CACHE_DIR, name))
+        except FileNotFoundError:
+            pass
+        total -= size
+
+
+def store(key: str, **arrays) -> None:
+    """Write atomically, the cache is skipped if it is not writable."""
+    try:
+        os.makedirs(SNAPSHOT_CACHE_DIR, exist_ok=True)
+        tmp = cache_file(key) + f".{os.getpid()}.tmp.npz"
+        np.savez(tmp, **arrays)
+        os.replace(tmp, cache_file(key))
+        evict()
+    except OSError:
+        pass
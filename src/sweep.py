@@ -0,0 +1,102 @@
+import copy
+import itertools
+import numpy as np
+from typing import List
+from .simulation import Simulation
+
+
+PARAMETERS = {"kT": float, "dt": float, "seed": lambda v: int(float(v)),
+              "period": float, "duration": float}
+COUNTS = ("rigidbodies", "solvent")
+
+
+def sweep_values(spec: any) -> list:
+    """Values of one swept parameter.
+
+    A list is taken as is, a mapping gives a range with `start`, `stop`
+    and either `num` (inclusive linspace) or `step` (exclusive arange)."""
+    if isinstance(spec, dict):
+        start, stop = float(spec["start"]), float(spec["stop"])
+        if "num" in spec:
+            values = np.linspace(start, stop, int(float(spec["num"])))
+        elif "step" in spec:
+            values = np.arange(start, stop, float(spec["step"]))
+        else:
+            raise Exception("Sweep range needs either num or step.")
+        return [float(f"{v:.12g}") for v in values]
+    if isinstance(spec, list):
+        return spec
+    return [spec]
+
+
+def parameter_sets(raw: dict, mode: str="product") -> List[dict]:
+    """Expand a sweep section into one parameter dict per run."""
+    keys, values = [], []
+    for key, spec in raw.items():
+        if key in COUNTS:
+            for item in spec:
+                label, counts = list(item.items())[0]
+                keys.append((key, label))
+                values.append(sweep_values(counts))
+        elif key in PARAMETERS:
+            keys.append(key)
+            values.append(sweep_values(spec))
+        else:
+            raise Exception(f"Parameter {key} can not be swept.")
+
+    if mode == "product":
+        combinations = itertools.product(*values)
+    elif mode == "zip":
+        if len(set(len(v) for v in values)) > 1:
+            raise Exception("Zipped sweep parameters differ in length.")
+        combinations = zip(*values)
+    else:
+        raise Exception(f"Sweep mode {mode} not recognized.")
+    return [dict(zip(keys, combination)) for combination in combinations]
+
+
+def apply(sim: Simulation, params: dict) -> Simulation:
+    """Copy of `sim` with the swept parameters set."""
+    member = copy.deepcopy(sim)
+    for key, value in params.items():
+        if key in PARAMETERS:
+            setattr(member, key, PARAMETERS[key](value))
+            continue
+        group, label = key
+        entries = member.rigidbodies if group == "rigidbodies" \
+                  else member.solvents
+        item = "rb" if group == "rigidbodies" else "sol"
+        matches = [e for e in entries if e[item].label == label]
+        if not matches:
+            raise Exception(f"Swept {group} entry {label} was not found.")
+        for entry in matches:
+            entry["count"] = int(float(value))
+    member.invalidate()
+    return member
+
+
+def members(sim: Simulation, param_sets: List[dict]) -> List[Simulation]:
+    """One simulation per parameter set, each with its own project name."""
+    sims = []
+    for i, params in enumerate(param_sets):
+        member = apply(sim, params)
+        member.project = f"{sim.project}-{i:03d}"
+        sims.append(member)
+    return sims
+
+
+def expand(sim: Simulation, raw: dict) -> List[Simulation]:
+    """Simulations of a sweep."""
+    raw = dict(raw)
+    mode = raw.pop("mode", "product")
+    return members(sim, parameter_sets(raw, mode))
+
+
+def children(sim: Simulation, raw: List[dict]) -> List[Simulation]:
+    """Simulations of the children of a fork, the composition is fixed by
+    the base frame so only the parameters can be set."""
+    for params in raw:
+        for key in params:
+            if key not in PARAMETERS:
+                raise Exception(f"Parameter {key} can not be set per child.")
+    return members(sim, raw)
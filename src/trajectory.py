@@ -0,0 +1,132 @@
+import os
+import json
+import bisect
+import tempfile
+import gsd.fl
+
+
+class FrameIndex:
+    """Sidecar index mapping the frames of a trajectory to timesteps.
+
+    The index is stored next to the trajectory as `<trajectory>.idx` and
+    is built lazily, only frames appended since the last update are read.
+    Continued runs restart their timestep counter, so steps are counted
+    across all segments of the trajectory. Continued runs record the step
+    they start from with `start_segment`, the frames of the segment are
+    counted from it. Without a record a segment continues from the last
+    frame of the previous one."""
+
+    def __init__(self, trajectory_file: str):
+        self.trajectory_file = trajectory_file
+        self.raw_steps = []
+        self.steps = []
+        self.starts = {}
+        self.size = 0
+        self._load()
+
+
+    @property
+    def index_file(self) -> str:
+        return self.trajectory_file + ".idx"
+
+
+    @property
+    def nframes(self) -> int:
+        return len(self.steps)
+
+
+    def _load(self) -> None:
+        if not os.path.exists(self.index_file): return
+        try:
+            with open(self.index_file, "r") as f:
+                data = json.load(f)
+            self.raw_steps = [int(s) for s in data["steps"]]
+            self.starts = {int(frame): int(step) for frame, step
+                           in data.get("starts", {}).items()}
+            self.size = int(data["size"])
+        except (ValueError, KeyError):
+            self.raw_steps = []
+            self.starts = {}
+            self.size = 0
+        self._accumulate(0)
+
+
+    def _accumulate(self, start: int) -> None:
+        del self.steps[start:]
+        for frame in range(start, len(self.raw_steps)):
+            raw = self.raw_steps[frame]
+            if frame in self.starts:
+                self.steps.append(self.starts[frame] + raw)
+            elif frame == 0:
+                self.steps.append(raw)
+            elif raw < self.raw_steps[frame-1]:
+                self.steps.append(self.steps[-1] + raw)
+            else:
+                self.steps.append(self.steps[-1] + raw
+                                  - self.raw_steps[frame-1])
+
+
+    def _save(self) -> None:
+        # Every MPI rank may update the index, each writes its own file
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(self.index_file),
+                                   prefix=os.path.basename(self.index_file),
+                                   suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({"size": self.size, "steps": self.raw_steps,
+                       "starts": self.starts}, f)
+        os.replace(tmp, self.index_file)
+
+
+    def update(self) -> None:
+        if not os.path.exists(self.trajectory_file):
+            raise Exception(f"Trajectory {self.trajectory_file} not found.")
+        size = os.path.getsize(self.trajectory_file)
+        if size == self.size: return
+        if size < self.size:
+            self.raw_steps = []
+            self.starts = {}
+
+        start = len(self.raw_steps)
+        with gsd.fl.open(name=self.trajectory_file, mode="rb") as f:
+            for frame in range(start, f.nframes):
+                step = 0
+                if f.chunk_exists(frame=frame, name="configuration/step"):
+                    step = int(f.read_chunk(frame=frame,
+                                            name="configuration/step")[0])
+                self.raw_steps.append(step)
+        self._accumulate(start)
+        self.size = size
+        self._save()
+
+
+    def start_segment(self, step: int) -> None:
+        """Count the frames appended from now on from `step`."""
+        self.update()
+        self.starts[self.nframes] = int(step)
+        self._save()
+
+
+    def step(self, frame: int) -> int:
+        return self.steps[frame]
+
+
+    def frame_at(self, step: int) -> int:
+        """Last frame written at `step`."""
+        frame = bisect.bisect_right(self.steps, step) - 1
+        if frame < 0 or self.steps[frame] != step:
+            raise Exception(f"No frame was written at step {step}.")
+        return frame
+
+
+    def resolve(self, frame: int=-1, step: int=None) -> int:
+        """Frame index of `frame` or `step`, with bounds checked."""
+        self.update()
+        if self.nframes == 0:
+            raise Exception("Trajectory has no frames.")
+        if step is not None:
+            return self.frame_at(int(float(step)))
+        frame = int(frame)
+        if frame < 0: frame += self.nframes
+        if frame < 0 or frame >= self.nframes:
+            raise Exception("Frame is out of bounds.")
+        return frame
@@ -1,9 +1,15 @@
 import os
+import math
+import itertools
 import numpy as np
 
 BASE_DIR = "/hoomd-examples/workdir"
 SIMULATIONS_DIR = os.path.join(BASE_DIR, "simulations")
 LOG_FILE = os.path.join(SIMULATIONS_DIR, ".current_files.txt")
+PARSE_CACHE_DIR = os.path.join(SIMULATIONS_DIR, ".parse_cache")
+CATALOG_FILE = os.path.join(SIMULATIONS_DIR, ".catalog.sqlite")
+SNAPSHOT_CACHE_DIR = os.path.join(SIMULATIONS_DIR, ".snapshot_cache")
+CALIBRATION_FILE = os.path.join(SIMULATIONS_DIR, ".calibration.jsonl")
 
 
 def random_quaternion() -> list:
@@ -17,40 +23,182 @@ def random_quaternion() -> list:
 
 
 
+def random_quaternions(n: int, rng: np.random.Generator=None) -> np.array:
+    """Draw `n` quaternions at once, distributed as random_quaternion,
+    from `rng` or the global numpy generator."""
+    rng = np.random if rng is None else rng
+    v = rng.uniform(0, 1, size=(n, 3))
+    q = np.zeros((n, 4))
+    q[:, 1:] = v / np.linalg.norm(v, axis=1)[:, None]
+    return q
+
+
+
+def minimum_image(d: np.array, L: np.array) -> np.array:
+    """Wrap separation vectors into the periodic box."""
+    return d - L * np.round(d / L)
+
+
+
+class SpatialHash:
+    """Occupied cells of a periodic box, kept between placements.
+
+    Cells are at least `cell_size` wide, so collisions closer than
+    `cell_size` only need a look at the 27 neighbouring cells."""
+
+    def __init__(self, box: "Box", cell_size: float):
+        self.L = np.array([box.Lx, box.Ly, box.Lz], dtype=float)
+        self.ncells = tuple(max(int(l // max(cell_size, 1e-12)), 1)
+                            for l in self.L)
+        self.cell_size = float(cell_size)
+        self._cells = {}
+        self._neighbours = {}
+
+
+    def __len__(self) -> int:
+        return sum(len(ps) for ps in self._cells.values())
+
+
+    def cell_of(self, position: np.array) -> tuple:
+        return tuple(math.floor((x/l + 0.5) * n) % n
+                     for x, l, n in zip(position, self.L, self.ncells))
+
+
+    def neighbour_cells(self, cell: tuple) -> list:
+        if cell not in self._neighbours:
+            shifts = itertools.product((-1, 0, 1), repeat=3)
+            self._neighbours[cell] = list({
+                tuple((c + s) % n for c, s, n in zip(cell, shift, self.ncells))
+                for shift in shifts})
+        return self._neighbours[cell]
+
+
+    def add(self, position: np.array) -> None:
+        self._cells.setdefault(self.cell_of(position), []).append(
+            np.asarray(position, dtype=float))
+
+
+    def collides(self, position: np.array, dmin: float) -> bool:
+        if dmin > self.cell_size:
+            raise Exception("Collision distance exceeds the cell size.")
+        position = np.asarray(position, dtype=float)
+        placed = []
+        for cell in self.neighbour_cells(self.cell_of(position)):
+            placed += self._cells.get(cell, [])
+        if not placed: return False
+        d = minimum_image(np.asarray(placed) - position, self.L)
+        return bool(np.any(np.einsum("ij,ij->i", d, d) <= dmin**2))
+
+
+
 def place_particle(snap: "Snapshot", placed_particles: int,
                    fixed_position: np.array=None,
-                   dmin: float=0., maxiter: int=1e3) -> None:
+                   dmin: float=0., maxiter: int=1e3,
+                   grid: SpatialHash=None,
+                   rng: np.random.Generator=None) -> None:
     """Place a particle into the Snapshot.
-    Give random coordinates if None given."""
+    Give random coordinates if None given, drawn from `rng` or the global
+    numpy generator.
+
+    Pass the same `grid` for every particle of a snapshot to keep the
+    occupied cells between calls, otherwise one is built from the
+    particles placed so far."""
+
+    rng = np.random if rng is None else rng
+
+    if grid is None:
+        grid = SpatialHash(snap.box, dmin)
+        for i in range(placed_particles):
+            grid.add(snap.particles.position[i])
 
+    L = np.array([snap.box.Lx, snap.box.Ly, snap.box.Lz])
     is_colliding = True
     iteration = 0
 
     while is_colliding:
 
-        is_colliding = False
         is_fixed = False
 
         if fixed_position is not None:
             position = np.asarray(fixed_position)
             is_fixed = True
         else:
-            x = np.random.randint(low=-snap.box.Lx/2., high=snap.box.Lz/2.)
-            y = np.random.randint(low=-snap.box.Ly/2., high=snap.box.Ly/2.)
-            z = np.random.randint(low=-snap.box.Lz/2., high=snap.box.Lz/2.)
-            position = np.array([x, y, z])
+            position = rng.uniform(low=-L/2., high=L/2.)
 
-        for i in range(placed_particles):
-            placed = np.asarray(snap.particles.position[i])
-            if np.linalg.norm(position - placed) <= dmin:
-                if is_fixed:
-                    raise Exception("Fixed particles are colliding.")
-                is_colliding = True
-                break
+        is_colliding = grid.collides(position, dmin)
+        if is_colliding and is_fixed:
+            raise Exception("Fixed particles are colliding.")
 
         iteration += 1
-        if iteration >= maxiter:
+        if is_colliding and iteration >= maxiter:
             raise Exception("Surpased maximum number of iterations.")
 
     snap.particles.position[placed_particles] = position
+    grid.add(position)
+
+
+
+# Sites of the conventional unit cell, in units of the cell length, and
+# the nearest neighbour distance in units of the lattice constant
+LATTICES = {
+    "sc": (np.array([[0., 0., 0.]]), 1.),
+    "bcc": (np.array([[0., 0., 0.], [.5, .5, .5]]), math.sqrt(3) / 2.),
+    "fcc": (np.array([[0., 0., 0.], [.5, .5, 0.], [.5, 0., .5],
+                      [0., .5, .5]]), 1. / math.sqrt(2)),
+}
+
+
+def lattice_sites(box: "Box", n: int, lattice: str="sc",
+                  exclude: np.array=None, dmin: float=0.,
+                  jitter: float=0.,
+                  rng: np.random.Generator=None) -> np.array:
+    """Sites of a lattice filling the periodic box, at least `n` of them.
+
+    The unit cells are as close to cubic as the box allows. Sites closer
+    than `dmin` to an `exclude` position are left out and the lattice is
+    refined until enough remain. Sites are displaced by up to `jitter`
+    times the nearest neighbour distance along each axis. The jitter is
+    limited so sites stay `dmin` apart: a site moves by up to
+    sqrt(3) * jitter * spacing, so 2 sqrt(3) jitter spacing must stay
+    below spacing - dmin, and sites keep dmin plus that shift from the
+    excluded positions. The jitter is drawn from `rng` or the global
+    numpy generator."""
+    if lattice not in LATTICES:
+        raise Exception(f"Lattice {lattice} not recognized.")
+    basis, nearest = LATTICES[lattice]
+    L = np.array([box.Lx, box.Ly, box.Lz], dtype=float)
+    exclude = np.zeros((0, 3)) if exclude is None \
+              else np.asarray(exclude, dtype=float).reshape(-1, 3)
+
+    target = n
+    while True:
+        a = (np.prod(L) * len(basis) / max(target, 1))**(1/3.)
+        cells = np.maximum(np.ceil(L / a).astype(int), 1)
+        cell = L / cells
+        spacing = nearest * cell.min()
+        if spacing < dmin:
+            raise Exception("Lattice spacing is below the minimum distance, "
+                            "the box is too dense.")
+        shift = np.sqrt(3.) * jitter * spacing
+        if jitter > 0. and 2. * shift >= spacing - dmin:
+            raise Exception(f"Jitter {jitter} would move sites closer than "
+                            f"the minimum distance, it must be below "
+                            f"{(1. - dmin / spacing) / (2. * np.sqrt(3.)):.3g}"
+                            f" at this density.")
+        grid = np.stack(np.meshgrid(*[np.arange(c) for c in cells],
+                                    indexing="ij"), axis=-1).reshape(-1, 3)
+        sites = ((grid[:, None, :] + basis[None, :, :]).reshape(-1, 3)
+                 * cell - L / 2.)
+        keep = np.ones(len(sites), dtype=bool)
+        for position in exclude:
+            d = minimum_image(sites - position, L)
+            keep &= np.einsum("ij,ij->i", d, d) > (dmin + shift)**2
+        sites = sites[keep]
+        if len(sites) >= n: break
+        target += n - len(sites)
 
+    if jitter > 0.:
+        rng = np.random if rng is None else rng
+        sites += rng.uniform(-jitter, jitter, sites.shape) * spacing
+        sites = minimum_image(sites, L)
+    return sites
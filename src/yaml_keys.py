@@ -19,5 +19,8 @@ class Key(Enum):
     SIMULATION = "simulation"
     ACTION = "action"
     BASE = "base"
+    SWEEP = "sweep"
+    CHILDREN = "children"
+    ANALYSIS = "analysis"
 
     FORKED_FROM = "forked_from"
@@ -0,0 +1,31 @@
+from src.interaction import Interaction, DEFAULT_R_CUT, max_cutoff, \
+                            shift_mode
+
+
+def test_shift_when_all_pairs_are_wca():
+    pairs = [Interaction("A", "A", 1, 1, 0, cutoff="wca"),
+             Interaction("A", "B", 1, 2, 0, cutoff="wca")]
+    assert shift_mode(pairs) == "shift"
+
+
+def test_no_shift_for_mixed_pairs():
+    pairs = [Interaction("A", "A", 1, 1, 0, cutoff="wca"),
+             Interaction("A", "B", 1, 1, 0, cutoff="n_sigma", n_sigma=3),
+             Interaction("B", "B", 1, 1, 0, cutoff="explicit", r_cut=4),
+             Interaction("A", "C", 1, 1, 0)]
+    assert shift_mode(pairs) == "no_shift"
+
+
+def test_pairs_without_interaction_are_ignored():
+    pairs = [Interaction("A", "A", 1, 1, 0, cutoff="wca"),
+             Interaction("A", "B", 0, 1, 0)]
+    assert shift_mode(pairs) == "shift"
+    assert shift_mode([]) == "no_shift"
+
+
+def test_max_cutoff_falls_back_without_interacting_pairs():
+    assert max_cutoff([]) == DEFAULT_R_CUT
+    assert max_cutoff([Interaction("A", "A", 0, 1, 0)]) == DEFAULT_R_CUT
+    pairs = [Interaction("A", "A", 0, 1, 0),
+             Interaction("A", "B", 1, 1, 0, cutoff="explicit", r_cut=4)]
+    assert max_cutoff(pairs) == 4.
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+from src import utils
+from src.box import Box
+
+
+def min_distance(a: np.array, b: np.array, L: float) -> float:
+    d = a[:, None] - b[None]
+    d -= L * np.round(d / L)
+    r = np.sqrt(np.einsum("ijk,ijk->ij", d, d))
+    if a is b: np.fill_diagonal(r, np.inf)
+    return r.min()
+
+
+def test_jittered_sites_keep_minimum_distance():
+    np.random.seed(1)
+    exclude = np.zeros((1, 3))
+    sites = utils.lattice_sites(Box(60, 60, 60), 1000, "fcc",
+                                exclude=exclude, dmin=4., jitter=0.05)
+    assert len(sites) >= 1000
+    assert min_distance(sites, sites, 60.) > 4.
+    assert min_distance(sites, exclude, 60.) > 4.
+
+
+def test_jitter_above_limit_is_rejected():
+    with pytest.raises(Exception, match="Jitter"):
+        utils.lattice_sites(Box(60, 60, 60), 1000, "sc", dmin=4.,
+                            jitter=0.2)
+
+
+def test_jitter_from_generator_leaves_global_state():
+    np.random.seed(1)
+    state = np.random.get_state()[1].copy()
+    a = utils.lattice_sites(Box(60, 60, 60), 100, "sc", dmin=4.,
+                            jitter=0.05, rng=np.random.default_rng(3))
+    b = utils.lattice_sites(Box(60, 60, 60), 100, "sc", dmin=4.,
+                            jitter=0.05, rng=np.random.default_rng(3))
+    assert np.array_equal(a, b)
+    assert np.array_equal(np.random.get_state()[1], state)
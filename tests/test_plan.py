@@ -0,0 +1,69 @@
+import json
+import pytest
+from src import plan
+
+
+@pytest.mark.parametrize("value, size", [
+    (1024, 1024), ("512", 512), ("1K", 1 << 10), ("20G", 20 << 30),
+    ("20GiB", 20 << 30), ("1.5 MiB", 3 << 19), ("2gb", 2 << 30),
+    ("3T", 3 << 40), ("100B", 100)])
+def test_parse_size(value, size):
+    assert plan.parse_size(value) == size
+
+
+@pytest.mark.parametrize("value", ["", "G", "20X", "20 GiBs", "-1G"])
+def test_parse_size_rejects(value):
+    with pytest.raises(Exception):
+        plan.parse_size(value)
+
+
+def test_parse_size_reads_format_size():
+    assert plan.parse_size(plan.format_size(20 << 30)) == 20 << 30
+
+
+def test_exceeded():
+    estimate = {"disk": 2 << 30, "memory": 1 << 30, "hours": 10.}
+    assert plan.exceeded(estimate, {}) == []
+    assert plan.exceeded(estimate, {"disk": "4GiB", "memory": "1G",
+                                    "hours": 10}) == []
+    over = plan.exceeded(estimate, {"disk": "1GiB", "hours": 5})
+    assert len(over) == 2
+    assert over[0].startswith("disk use")
+    assert over[1].startswith("wall time")
+
+
+def test_exceeded_without_wall_time():
+    estimate = {"disk": 0, "memory": 0, "hours": None}
+    assert plan.exceeded(estimate, {"hours": 1}) == []
+
+
+@pytest.fixture
+def calibration(tmp_path, monkeypatch):
+    file = tmp_path / "calibration.jsonl"
+    monkeypatch.setattr(plan, "CALIBRATION_FILE", str(file))
+    entries = [{"device": "gpu", "particles": 1000, "mean_tps": 1000.},
+               {"device": "gpu", "particles": 100000, "mean_tps": 30.},
+               {"device": "cpu:8", "particles": 1000, "mean_tps": 50.}]
+    file.write_text("".join(json.dumps(e) + "\n" for e in entries)
+                    + "not json\n")
+    return file
+
+
+def test_estimate_tps_at_measured_points(calibration):
+    assert plan.estimate_tps("gpu", 1000) == pytest.approx(1000.)
+    assert plan.estimate_tps("gpu", 100000) == pytest.approx(30.)
+    assert plan.estimate_tps("cpu:8", 1000) == pytest.approx(50.)
+
+
+def test_estimate_tps_interpolates_throughput(calibration):
+    # Halfway in log(N) between 1e6 and 3e6 particle steps per second
+    assert plan.estimate_tps("gpu", 10000) == pytest.approx(2e6 / 10000)
+
+
+def test_estimate_tps_outside_measured_range(calibration):
+    assert plan.estimate_tps("gpu", 100) == pytest.approx(1e6 / 100)
+    assert plan.estimate_tps("gpu", 1000000) == pytest.approx(3e6 / 1e6)
+
+
+def test_estimate_tps_without_measurements(calibration):
+    assert plan.estimate_tps("cpu:4", 1000) is None
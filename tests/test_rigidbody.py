@@ -0,0 +1,34 @@
+import numpy as np
+from src.particle import Particle
+from src.rigidbody import RigidBody
+
+
+def make_body() -> RigidBody:
+    """Center particle off the center of mass of the body."""
+    rb = RigidBody("R")
+    rb.add_particle(Particle("A", m=1), (0., 0., 0.), is_center=True)
+    rb.add_particle(Particle("B", m=1), (1., 0., 0.))
+    rb.add_particle(Particle("B", m=1), (0., 2., 0.))
+    return rb
+
+
+def test_body_positions_are_relative_to_center():
+    rb = make_body()
+    center = rb.body_positions[rb.is_center][0]
+    assert np.allclose(center, 0.)
+
+
+def test_body_positions_keep_center_distances():
+    rb = make_body()
+    aux = ~rb.is_center
+    before = np.linalg.norm(rb.positions[aux] - rb.origin, axis=1)
+    after = np.linalg.norm(rb.body_positions[aux], axis=1)
+    assert np.allclose(before, [1., 2.])
+    assert np.allclose(after, before)
+
+
+def test_body_positions_are_a_rotation():
+    rb = make_body()
+    d = rb.positions[:, None] - rb.positions[None, :]
+    b = rb.body_positions[:, None] - rb.body_positions[None, :]
+    assert np.allclose(np.linalg.norm(d, axis=2), np.linalg.norm(b, axis=2))